@@ -0,0 +1,458 @@
+import copy
+import importlib
+import importlib.util
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from .breaker import get_breaker
+from .converters import build_conversions
+from .deadline import DeadlineMixin
+from .guards import MultipleRowsError, SizeGuard, close_cursor, fetch_limited
+from .interning import Interner
+from .profiler import ObserverMixin, SideExplain
+from .records import Row
+from .retry import DEFAULT_RETRY_POLICY, DISCONNECT_ERRORS, error_code, lost_transaction
+from .upsert import upsert
+
+logger = logging.getLogger(__name__)
+
+
+class Driver(object):
+    """Lazily imports a DB-API module and knows how to connect with it."""
+
+    name = None
+    module_name = None
+
+    def __init__(self):
+        self._module = None
+        self._lock = threading.Lock()
+
+    @property
+    def module(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    module = self._import()
+                    self._load(module)
+                    self._module = module
+        return self._module
+
+    @property
+    def loaded(self):
+        return self._module is not None
+
+    def _import(self):
+        return importlib.import_module(self.module_name)
+
+    def _load(self, module):
+        importlib.import_module(self.module_name + ".converters")
+        importlib.import_module(self.module_name + ".cursors")
+
+    def connect_args(self, database, user, password):
+        raise NotImplementedError()
+
+    def base_conversions(self):
+        return self.module.converters.conversions
+
+    def connect(self, database=None, user=None, password=None, converters="default", **kwargs):
+        kwargs.update(self.connect_args(database, user, password))
+        kwargs.setdefault("conv", build_conversions(self.base_conversions(), converters))
+        return self.module.connect(**kwargs)
+
+    def ss_cursor(self, db):
+        return self.module.cursors.SSCursor(db)
+
+
+class MySQLdbDriver(Driver):
+    name = "mysqldb"
+    module_name = "MySQLdb"
+
+    def _import(self):
+        try:
+            return importlib.import_module("MySQLdb")
+        except ImportError:
+            import pymysql
+            pymysql.install_as_MySQLdb()
+            return importlib.import_module("MySQLdb")
+
+    def _load(self, module):
+        super(MySQLdbDriver, self)._load(module)
+        importlib.import_module("MySQLdb.constants")
+        FIELD_TYPE = module.constants.FIELD_TYPE
+        FLAG = module.constants.FLAG
+        conversions = copy.copy(module.converters.conversions)
+        field_types = [FIELD_TYPE.BLOB, FIELD_TYPE.STRING, FIELD_TYPE.VAR_STRING]
+        if "VARCHAR" in vars(FIELD_TYPE):
+            field_types.append(FIELD_TYPE.VARCHAR)
+        for field_type in field_types:
+            conversions[field_type] = [(FLAG.BINARY, str)] + conversions[field_type]
+        self.conversions = conversions
+
+    def base_conversions(self):
+        # Loading the module is what builds the conversions.
+        return self.module and self.conversions
+
+    def connect_args(self, database, user, password):
+        args = {"db": database}
+        if user is not None:
+            args["user"] = user
+        if password is not None:
+            args["passwd"] = password
+        return args
+
+
+class PyMySQLDriver(Driver):
+    name = "pymysql"
+    module_name = "pymysql"
+
+    def connect_args(self, database, user, password):
+        args = {"database": database}
+        if user is not None:
+            args["user"] = user
+        if password is not None:
+            args["password"] = password
+        return args
+
+
+DRIVERS = {
+    "mysqldb": MySQLdbDriver(),
+    "pymysql": PyMySQLDriver(),
+}
+
+
+def get_driver(name="auto"):
+    """Returns the `Driver` registered as ``name``.
+
+    ``"auto"`` prefers MySQLdb and falls back to PyMySQL, resolving the
+    choice without importing either driver until it is first used.
+    """
+    if name == "auto":
+        if importlib.util.find_spec("MySQLdb") is not None:
+            name = "mysqldb"
+        else:
+            name = "pymysql"
+    try:
+        return DRIVERS[name]
+    except KeyError:
+        raise ValueError("Unknown driver: {!r}".format(name))
+
+
+class Connection(DeadlineMixin, ObserverMixin):
+    """A MySQL connection whose driver is picked by the ``driver`` argument.
+
+    Nothing is imported or opened until the first query (or an explicit
+    `reconnect`). Results are always `Row` objects; ``execute``, ``insert``
+    and ``insertmany`` return the lastrowid, while ``execute_rowcount``,
+    ``update``, ``delete`` and ``updatemany`` return the rowcount.
+    Statements are autocommitted outside of `transaction`, unless
+    ``autocommit`` is False (or None, to keep the driver's default).
+    """
+
+    _in_transaction = False
+
+    def __init__(
+        self,
+        host,
+        database,
+        user=None,
+        password=None,
+        driver="auto",
+        max_idle_time=7 * 3600,
+        connect_timeout=10,
+        time_zone="+0:00",
+        charset="utf8",
+        sql_mode="TRADITIONAL",
+        query_timeout=None,
+        converters="default",
+        max_result_rows=None,
+        max_result_bytes=None,
+        autocommit=True,
+        **kwargs
+    ):
+        self.host = host
+        self.database = database
+        self.max_idle_time = float(max_idle_time)
+        self.query_timeout = query_timeout
+        self.max_result_rows = max_result_rows
+        self.max_result_bytes = max_result_bytes
+        self.autocommit = autocommit
+        self.driver = get_driver(driver)
+
+        args = dict(
+            charset=charset,
+            init_command=('SET time_zone = "%s"' % time_zone),
+            connect_timeout=connect_timeout,
+            sql_mode=sql_mode,
+            converters=converters,
+            **kwargs
+        )
+        pair = host.split(":")
+        if len(pair) == 2:
+            args["host"] = pair[0]
+            args["port"] = int(pair[1])
+        else:
+            args["host"] = host
+            args["port"] = 3306
+
+        self._db = None
+        self._db_args = args
+        self._user = user
+        self._password = password
+        self._last_use_time = time.time()
+
+    def __del__(self):
+        self.close()
+
+    def __repr__(self):
+        return "<Connection driver={} host={} open={}>".format(
+            self.driver.name, self.host, self._db is not None)
+
+    @property
+    def Error(self):
+        return self.driver.module.Error
+
+    @property
+    def OperationalError(self):
+        return self.driver.module.OperationalError
+
+    @property
+    def IntegrityError(self):
+        return self.driver.module.IntegrityError
+
+    def close(self):
+        """Closes this database connection."""
+        if getattr(self, "_db", None) is not None:
+            self._db.close()
+            self._db = None
+
+    def reconnect(self):
+        """Closes the existing database connection and re-opens it, failing
+        fast with `breaker.CircuitOpenError` while the host is down.
+        """
+        self.close()
+        breaker = get_breaker(self._db_args["host"], self._db_args["port"])
+        self._db = breaker.connect(self._connect, self.OperationalError)
+        if self.autocommit is not None:
+            self._db.autocommit(self.autocommit)
+
+    def ping(self, reconnect=True):
+        """Checks that the server is alive, reconnecting if it is not and
+        ``reconnect`` is set.
+        """
+        if self._db is None:
+            if not reconnect:
+                raise self.Error("Already closed")
+            self.reconnect()
+            reconnect = False
+        try:
+            self._db.ping()
+        except Exception:
+            if not reconnect:
+                raise
+            self.reconnect()
+            self._db.ping()
+
+    def iter(self, query, *params, **kwparams):
+        """Returns an iterator for the given query and parameters."""
+        self._ensure_connected()
+        cursor = self.driver.ss_cursor(self._db)
+        try:
+            self._execute(cursor, query, params, kwparams)
+            column_names = [d[0] for d in cursor.description]
+            for row in cursor:
+                yield Row(zip(column_names, row))
+        finally:
+            cursor.close()
+
+    def query(self, query, *params, intern_columns=None, max_rows=None, max_bytes=None,
+              **kwparams):
+        """Returns a row list for the given query and parameters.
+
+        ``intern_columns`` (a list of column names, or True for every
+        low-cardinality column) makes equal values in those columns share
+        one object across the returned rows.
+
+        ``max_rows`` and ``max_bytes`` default to the connection's
+        ``max_result_rows`` and ``max_result_bytes``. When either is set the
+        result is read unbuffered and `guards.ResultTooLargeError` is
+        raised as soon as it passes a limit.
+        """
+        guard = SizeGuard(self.max_result_rows if max_rows is None else max_rows,
+                          self.max_result_bytes if max_bytes is None else max_bytes)
+        cursor = self._unbuffered_cursor() if guard else self._cursor()
+        try:
+            rows = self._execute(cursor, query, params, kwparams, guard)
+            column_names = [d[0] for d in cursor.description]
+            if not guard:
+                rows = cursor
+            if intern_columns:
+                interner = Interner(column_names, intern_columns)
+                return [Row(zip(column_names, interner(row))) for row in rows]
+            return [Row(zip(column_names, row)) for row in rows]
+        finally:
+            if guard:
+                close_cursor(cursor)
+            else:
+                cursor.close()
+
+    def get(self, query, *params, max_bytes=None, **kwparams):
+        """Returns the (singular) row returned by the given query.
+        If the query has no results, returns None.  If it has
+        more than one result, raises `guards.MultipleRowsError` as soon
+        as the second row is read.
+        """
+        guard = SizeGuard(1, self.max_result_bytes if max_bytes is None else max_bytes,
+                          MultipleRowsError("Multiple rows returned for Database.get() query"))
+        cursor = self._unbuffered_cursor()
+        try:
+            rows = self._execute(cursor, query, params, kwparams, guard)
+            column_names = [d[0] for d in cursor.description]
+            return Row(zip(column_names, rows[0])) if rows else None
+        finally:
+            close_cursor(cursor)
+
+    def execute_lastrowid(self, query, *params, **kwparams):
+        """Executes the given query, returning the lastrowid from the query."""
+        cursor = self._cursor()
+        try:
+            self._execute(cursor, query, params, kwparams)
+            return cursor.lastrowid
+        finally:
+            cursor.close()
+
+    def execute_rowcount(self, query, *params, **kwparams):
+        """Executes the given query, returning the rowcount from the query."""
+        cursor = self._cursor()
+        try:
+            self._execute(cursor, query, params, kwparams)
+            return cursor.rowcount
+        finally:
+            cursor.close()
+
+    def executemany_lastrowid(self, query, params):
+        """Executes the given query against all the given param sequences.
+        We return the lastrowid from the query.
+        """
+        cursor = self._cursor()
+        try:
+            with self._enforce_deadline(query) as query:
+                cursor.executemany(query, params)
+            return cursor.lastrowid
+        finally:
+            cursor.close()
+
+    def executemany_rowcount(self, query, params):
+        """Executes the given query against all the given param sequences.
+        We return the rowcount from the query.
+        """
+        cursor = self._cursor()
+        try:
+            with self._enforce_deadline(query) as query:
+                cursor.executemany(query, params)
+            return cursor.rowcount
+        finally:
+            cursor.close()
+
+    def upsert(self, table, keys, rows, update=None, chunk_size=500):
+        """Inserts or updates the given dict rows into ``table`` using chunked
+        ``INSERT ... ON DUPLICATE KEY UPDATE`` statements.
+
+        ``keys`` names the unique key column(s); by default every other
+        column is updated on duplicates. Returns a list of per-chunk
+        ``{"rows", "affected", "inserted", "updated"}`` counts.
+        """
+        return upsert(lambda sql, params: self.execute_rowcount(sql, *params),
+                      table, keys, rows, update=update, chunk_size=chunk_size)
+
+    execute = insert = execute_lastrowid
+    update = delete = execute_rowcount
+    executemany = insertmany = executemany_lastrowid
+    updatemany = executemany_rowcount
+
+    def _ensure_connected(self):
+        if self._in_transaction:
+            if self._db is None:
+                raise lost_transaction(self.OperationalError)
+        elif self._db is None or (time.time() - self._last_use_time > self.max_idle_time):
+            self.reconnect()
+        self._last_use_time = time.time()
+
+    def _cursor(self):
+        self._ensure_connected()
+        return self._db.cursor()
+
+    def _unbuffered_cursor(self):
+        self._ensure_connected()
+        return self.driver.ss_cursor(self._db)
+
+    def _thread_id(self):
+        return self._db.thread_id()
+
+    def _connect(self):
+        return self.driver.connect(database=self.database, user=self._user,
+                                   password=self._password, **self._db_args)
+
+    _side_connection = _connect
+
+    def _execute(self, cursor, query, params, kwparams, guard=None):
+        # With a ``guard``, the unbuffered result is read here as well, so
+        # that the deadline and the observed time cover fetching it.
+        start = time.time()
+        try:
+            with self._enforce_deadline(query) as sql:
+                result = cursor.execute(sql, kwparams or params)
+                if guard:
+                    result = fetch_limited(cursor, guard, self.close)
+        except self.OperationalError as e:
+            # Deadlocks, lock wait timeouts and the like leave the connection
+            # (and its transaction) usable; only drop it when it is gone.
+            if error_code(e) in DISCONNECT_ERRORS:
+                logger.error("Error connecting to MySQL on %s", self.host)
+                self.close()
+            raise
+        if self._observed:
+            self._observe(query, kwparams or params, start)
+        return result
+
+    def _explainer(self, query, args):
+        key = (self._db_args["host"], self._db_args["port"], self.database)
+        return SideExplain(key, self._side_connection, query, args)
+
+    @contextmanager
+    def transaction(self):
+        """A context manager for executing a transaction on this Database."""
+        self._ensure_connected()
+        self._db.begin()
+        self._in_transaction = True
+        try:
+            yield self
+            self._ensure_connected()
+            self._db.commit()
+        except Exception:
+            self._rollback()
+            raise
+        finally:
+            self._in_transaction = False
+
+    def _rollback(self):
+        # Never hides the error that caused the rollback. A dropped
+        # connection has been rolled back by the server already.
+        if self._db is None:
+            return
+        try:
+            self._db.rollback()
+        except Exception:
+            logger.warning("Cannot roll back on MySQL on %s", self.host, exc_info=True)
+            self.close()
+
+    def run_transaction(self, func, policy=None):
+        """Runs ``func(self)`` in a transaction and returns its result.
+
+        Deadlocks and lock wait timeouts re-run the whole transaction with
+        jittered exponential backoff according to ``policy`` (a
+        `retry.RetryPolicy`, shared `retry.DEFAULT_RETRY_POLICY` by default),
+        whose ``stats`` count the retries.
+        """
+        return (policy or DEFAULT_RETRY_POLICY).run(self.transaction, func)
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""Micro-benchmarks that do not need a MySQL server.
+
+    python -m torndb.bench [converters] [drivers] [interning]
+
+The ``drivers`` benchmark also times queries when ``TORNDB_BENCH_HOST``,
+``TORNDB_BENCH_DATABASE``, ``TORNDB_BENCH_USER`` and
+``TORNDB_BENCH_PASSWORD`` point at a server.
+"""
+import datetime
+import importlib.util
+import os
+import subprocess
+import sys
+import timeit
+import tracemalloc
+
+from torndb import converters
+from torndb.backend import DRIVERS
+from torndb.interning import Interner
+from torndb.records import Row
+
+# Every sample is a distinct value, as in a real result set, so that a
+# converter cannot win by recognising repeated input.
+SAMPLE_COUNT = 20000
+_EPOCH = datetime.datetime(2024, 5, 1)
+SAMPLES = {
+    converters.DATETIME: [(_EPOCH + datetime.timedelta(seconds=37 * i)).strftime(
+        "%Y-%m-%d %H:%M:%S").encode("ascii") for i in range(SAMPLE_COUNT)],
+    converters.DATE: [(_EPOCH.date() - datetime.timedelta(days=i)).isoformat().encode("ascii")
+                      for i in range(SAMPLE_COUNT)],
+    converters.NEWDECIMAL: [b"%d.%02d" % (i * 7, i % 100) for i in range(SAMPLE_COUNT)],
+    converters.JSON: [b'{"id": %d, "tags": ["a", "b"], "score": 1.5}' % i
+                      for i in range(SAMPLE_COUNT)],
+}
+
+TYPE_NAMES = {
+    converters.DATETIME: "DATETIME",
+    converters.DATE: "DATE",
+    converters.NEWDECIMAL: "DECIMAL",
+    converters.JSON: "JSON",
+}
+
+
+def driver_conversions():
+    for name in ("MySQLdb", "pymysql"):
+        try:
+            module = __import__(name + ".converters", fromlist=["conversions"])
+        except ImportError:
+            continue
+        return name, module.conversions
+    return None, {}
+
+
+def bench_converters(number=5):
+    """Prints the cost per converted value for every profile and field type,
+    compared with the installed driver's own converters, as the best of
+    ``number`` passes over the samples.
+    """
+    driver, base = driver_conversions()
+    profiles = [(driver or "driver", base)]
+    profiles += [(name, converters.build_conversions(base, name))
+                 for name in sorted(converters.PROFILES) if name != "default"]
+
+    print("{:<10}".format("type") + "".join("{:>12}".format(name) for name, _ in profiles))
+    for field_type, samples in SAMPLES.items():
+        line = "{:<10}".format(TYPE_NAMES[field_type])
+        for name, conv in profiles:
+            func = conv.get(field_type)
+            if func is None or not callable(func):
+                line += "{:>12}".format("-")
+                continue
+            try:
+                func(samples[0])
+            except Exception:
+                line += "{:>12}".format("error")
+                continue
+            seconds = min(timeit.repeat(lambda: [func(s) for s in samples],
+                                        number=1, repeat=number))
+            line += "{:>10.0f}ns".format(seconds / len(samples) * 1e9)
+        print(line)
+
+
+# A 1000-row result that needs no table (MySQL 8.0 and later).
+SEQUENCE_QUERY = ("WITH RECURSIVE seq (n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq "
+                  "WHERE n < 1000) SELECT n, CONCAT('row ', n) AS label, NOW() AS at FROM seq")
+
+
+def _import_time(module):
+    # A fresh interpreter, so that nothing is imported yet.
+    code = ("import time; t = time.perf_counter(); import {}; "
+            "print(time.perf_counter() - t)".format(module))
+    out = subprocess.check_output([sys.executable, "-c", code], cwd=os.path.dirname(
+        os.path.dirname(os.path.abspath(__file__))))
+    return float(out)
+
+
+def bench_drivers(number=1000):
+    """Prints the cold import time of each installed driver and of the
+    backend layer and, when a server is configured, the cost of a point
+    query and of a 1000-row query through `backend.Connection` per driver.
+    """
+    installed = [name for name, driver in sorted(DRIVERS.items())
+                 if importlib.util.find_spec(driver.module_name) is not None]
+    for module in ["torndb.backend"] + [DRIVERS[name].module_name for name in installed]:
+        print("{:<28}{:>10.1f}ms import".format(module, _import_time(module) * 1e3))
+
+    host = os.environ.get("TORNDB_BENCH_HOST")
+    if not host:
+        return
+    from torndb.backend import Connection
+    for name in installed:
+        db = Connection(host, os.environ.get("TORNDB_BENCH_DATABASE"),
+                        user=os.environ.get("TORNDB_BENCH_USER"),
+                        password=os.environ.get("TORNDB_BENCH_PASSWORD"), driver=name)
+        try:
+            point = timeit.timeit(lambda: db.get("SELECT 1 AS one"), number=number)
+            rows_number = max(1, number // 100)
+            rows = timeit.timeit(lambda: db.query(SEQUENCE_QUERY), number=rows_number)
+        finally:
+            db.close()
+        print("{:<28}{:>10.0f}us get {:>10.2f}ms 1000 rows".format(
+            name, point / number * 1e6, rows / rows_number * 1e3))
+
+
+def _join_rows(nrows, nauthors):
+    # Shaped like the entries JOIN authors query in test.py; every value is
+    # decoded separately, as the drivers do.
+    names = ["id", "author_id", "slug", "title", "author_name", "author_email"]
+    for i in range(nrows):
+        author = i % nauthors
+        yield names, (i, author, b"slug-%d" % i, b"Title %d" % i,
+                      b"author %d" % author, b"author%d@example.com" % author)
+
+
+def _measure(build):
+    tracemalloc.start()
+    rows = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return len(rows), size
+
+
+def bench_interning(nrows=100000, nauthors=50):
+    """Prints the memory held by a JOIN-shaped result set with and without
+    interning of repeated column values.
+    """
+    def plain():
+        return [Row(zip(names, [v.decode() if isinstance(v, bytes) else v for v in row]))
+                for names, row in _join_rows(nrows, nauthors)]
+
+    def interned(columns):
+        interner = Interner(["id", "author_id", "slug", "title", "author_name", "author_email"],
+                            columns)
+        return [Row(zip(names, interner([v.decode() if isinstance(v, bytes) else v for v in row])))
+                for names, row in _join_rows(nrows, nauthors)]
+
+    _, base = _measure(plain)
+    print("{:<28}{:>10.1f} MiB".format("no interning", base / 2 ** 20))
+    for label, columns in [("author_name, author_email", ["author_name", "author_email"]),
+                           ("all low-cardinality", True)]:
+        _, size = _measure(lambda: interned(columns))
+        print("{:<28}{:>10.1f} MiB {:>6.1%} saved".format(label, size / 2 ** 20, 1 - size / base))
+
+
+BENCHMARKS = {
+    "converters": bench_converters,
+    "drivers": bench_drivers,
+    "interning": bench_interning,
+}
+
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or sorted(BENCHMARKS)
+    for name in names:
+        print("== {} ==".format(name))
+        BENCHMARKS[name]()
@@ -0,0 +1,154 @@
+import logging
+import random
+import threading
+import time
+
+from .retry import CR_SERVER_GONE_ERROR, CR_SERVER_LOST, error_code
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+CR_CONNECTION_ERROR = 2002
+CR_CONN_HOST_ERROR = 2003
+CR_UNKNOWN_HOST = 2005
+# Errors meaning the host could not be reached, as opposed to it turning
+# down the login or the database, which says nothing about its health.
+CONNECT_ERRORS = frozenset([
+    CR_CONNECTION_ERROR, CR_CONN_HOST_ERROR, CR_UNKNOWN_HOST,
+    CR_SERVER_GONE_ERROR, CR_SERVER_LOST,
+])
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of connecting while a host is considered down.
+
+    Connections raise it as a subclass of their driver's
+    ``OperationalError`` as well (see `circuit_open_error`), with the
+    error code of a failed connect, so that existing handlers catch it.
+    """
+
+
+_error_classes = {}
+
+
+def circuit_open_error(base):
+    """Returns the `CircuitOpenError` subclass that also derives from ``base``."""
+    cls = _error_classes.get(base)
+    if cls is None:
+        cls = _error_classes.setdefault(
+            base, type("CircuitOpenError", (CircuitOpenError, base), {}))
+    return cls
+
+
+def is_connect_failure(exc):
+    """Tells whether a connect error means the host could not be reached."""
+    return isinstance(exc, OSError) or error_code(exc) in CONNECT_ERRORS
+
+
+class HostBreaker(object):
+    """Reconnect state shared by every connection to one MySQL host.
+
+    After ``failure_threshold`` consecutive failures to reach the host
+    (see `is_connect_failure`; other connect errors count as reaching it)
+    the circuit
+    opens and connects fail fast with `CircuitOpenError`. Once the
+    jittered exponential backoff (``base_delay * 2 ** n`` capped at
+    ``max_delay``) has passed, a single probe connect is let through:
+    success closes the circuit, failure re-opens it with a longer delay.
+    """
+
+    def __init__(self, host, failure_threshold=2, base_delay=0.5, max_delay=30.0):
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.state = CLOSED
+        self.failures = 0
+        self.opened = 0
+        self.rejected = 0
+        self.retry_at = 0.0
+        self._lock = threading.Lock()
+        self._probing = False
+
+    def __repr__(self):
+        return "<HostBreaker host={} state={} failures={}>".format(
+            self.host, self.state, self.failures)
+
+    def _backoff(self):
+        exponent = max(0, self.failures - self.failure_threshold)
+        delay = min(self.max_delay, self.base_delay * (2 ** exponent))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def _acquire(self, error_class):
+        with self._lock:
+            if self.state == CLOSED:
+                return False
+            if self.state == OPEN and time.time() >= self.retry_at:
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            self.rejected += 1
+            raise error_class(CR_CONN_HOST_ERROR, "MySQL on {} is unavailable; retrying in {:.2f}s"
+                              .format(self.host, max(0.0, self.retry_at - time.time())))
+
+    def _success(self, probe):
+        with self._lock:
+            if probe:
+                self._probing = False
+            if self.state != CLOSED:
+                logger.info("MySQL on %s recovered", self.host)
+            self.state = CLOSED
+            self.failures = 0
+
+    def _failure(self, probe):
+        with self._lock:
+            if probe:
+                self._probing = False
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.opened += 1
+                self.state = OPEN
+                self.retry_at = time.time() + self._backoff()
+                logger.warning("MySQL on %s unavailable after %d failures; next attempt in %.2fs",
+                               self.host, self.failures, self.retry_at - time.time())
+
+    def connect(self, connect, error_class=None):
+        """Calls ``connect()`` unless the circuit is open, recording its
+        outcome. An open circuit raises `CircuitOpenError`, also derived
+        from ``error_class`` when given.
+        """
+        error_class = CircuitOpenError if error_class is None else circuit_open_error(error_class)
+        probe = self._acquire(error_class)
+        try:
+            conn = connect()
+        except Exception as e:
+            if is_connect_failure(e):
+                self._failure(probe)
+            else:
+                self._success(probe)
+            raise
+        self._success(probe)
+        return conn
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+BREAKER_DEFAULTS = {}
+
+
+def get_breaker(host, port=3306):
+    """Returns the process-wide `HostBreaker` for ``host:port``, created with
+    `BREAKER_DEFAULTS` on first use.
+    """
+    key = "%s:%s" % (host, port)
+    with _breakers_lock:
+        breaker = _breakers.get(key)
+        if breaker is None:
+            breaker = _breakers[key] = HostBreaker(key, **BREAKER_DEFAULTS)
+        return breaker
@@ -0,0 +1,145 @@
+import calendar
+import datetime
+import json
+from decimal import Decimal
+
+# MySQL protocol field types, duplicated here so that profiles can be
+# built without importing a driver.
+DECIMAL = 0
+TIMESTAMP = 7
+DATE = 10
+DATETIME = 12
+JSON = 245
+NEWDECIMAL = 246
+
+
+def _text(s):
+    return s.decode("ascii") if isinstance(s, (bytes, bytearray)) else s
+
+
+def _parse_datetime(s):
+    # Slicing the fixed "YYYY-MM-DD HH:MM:SS[.ffffff]" layout is much
+    # cheaper than strptime.
+    try:
+        if len(s) < 11:
+            return _parse_date(s)
+        micro = int(s[20:26].ljust(6, "0")) if len(s) > 20 else 0
+        return datetime.datetime(int(s[0:4]), int(s[5:7]), int(s[8:10]),
+                                 int(s[11:13]), int(s[14:16]), int(s[17:19]), micro)
+    except ValueError:
+        # Zero dates such as "0000-00-00 00:00:00" cannot be represented.
+        return None
+
+
+def _parse_date(s):
+    try:
+        return datetime.date(int(s[0:4]), int(s[5:7]), int(s[8:10]))
+    except ValueError:
+        return None
+
+
+def fast_datetime(s):
+    """Parses DATETIME/TIMESTAMP values; zero dates become None."""
+    return _parse_datetime(_text(s))
+
+
+def fast_date(s):
+    """Parses DATE values; zero dates become None."""
+    return _parse_date(_text(s))
+
+
+def fast_decimal(s):
+    """Parses DECIMAL values."""
+    return Decimal(_text(s))
+
+
+def iso_datetime(s):
+    """Returns DATETIME/TIMESTAMP values as ISO 8601 strings."""
+    return _text(s).replace(" ", "T", 1)
+
+
+def epoch_datetime(s):
+    """Returns DATETIME/TIMESTAMP values as integer seconds since the epoch.
+    Values are read as UTC, so use this with ``time_zone="+0:00"``.
+    """
+    value = _parse_datetime(_text(s))
+    if value is None:
+        return None
+    return calendar.timegm(value.timetuple())
+
+
+class LazyJSON(object):
+    """A JSON column value that is only decoded when `value` is first read."""
+    __slots__ = ("raw", "_value")
+
+    _missing = object()
+
+    def __init__(self, raw):
+        self.raw = raw
+        self._value = self._missing
+
+    @property
+    def value(self):
+        if self._value is self._missing:
+            self._value = json.loads(self.raw)
+        return self._value
+
+    def __str__(self):
+        return _text(self.raw) if isinstance(self.raw, (bytes, bytearray)) else self.raw
+
+    def __repr__(self):
+        return "<LazyJSON {}>".format(str(self)[:60])
+
+    def __eq__(self, other):
+        if isinstance(other, LazyJSON):
+            return self.value == other.value
+        return self.value == other
+
+    __hash__ = None
+
+
+PROFILES = {
+    "default": {},
+    "fast": {
+        DATETIME: fast_datetime,
+        TIMESTAMP: fast_datetime,
+        DATE: fast_date,
+        DECIMAL: fast_decimal,
+        NEWDECIMAL: fast_decimal,
+    },
+    "iso": {
+        DATETIME: iso_datetime,
+        TIMESTAMP: iso_datetime,
+        DATE: _text,
+        DECIMAL: _text,
+        NEWDECIMAL: _text,
+    },
+    "epoch": {
+        DATETIME: epoch_datetime,
+        TIMESTAMP: epoch_datetime,
+        DATE: _text,
+    },
+    "lazy_json": {
+        JSON: LazyJSON,
+    },
+}
+
+
+def build_conversions(base, profile="default"):
+    """Returns a copy of a driver's ``conv`` mapping with the converters of
+    ``profile`` applied. ``profile`` is a name from `PROFILES`, a dict of
+    field type to converter, or a sequence of either to combine them.
+    """
+    if isinstance(profile, (list, tuple)):
+        profiles = profile
+    else:
+        profiles = [profile]
+    conv = dict(base)
+    for profile in profiles:
+        if isinstance(profile, str):
+            try:
+                profile = PROFILES[profile]
+            except KeyError:
+                raise ValueError("Unknown converter profile: {!r}".format(profile))
+        conv.update(profile)
+    return conv
@@ -0,0 +1,186 @@
+import heapq
+import itertools
+import logging
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from .retry import error_code
+
+logger = logging.getLogger(__name__)
+
+ER_QUERY_TIMEOUT = 3024
+
+_SELECT_RE = re.compile(r"^\s*SELECT\b", re.IGNORECASE)
+
+
+class QueryTimeoutError(Exception):
+    """Raised when a query runs past its deadline and is cancelled. The
+    connection it ran on stays usable."""
+
+
+def add_max_execution_time(query, timeout):
+    """Adds a ``MAX_EXECUTION_TIME`` optimizer hint to a SELECT statement.
+    Returns ``(query, hinted)``; other statements are returned unchanged.
+    """
+    match = _SELECT_RE.match(query)
+    if match is None or "MAX_EXECUTION_TIME" in query.upper():
+        return query, False
+    hint = " /*+ MAX_EXECUTION_TIME(%d) */" % max(1, int(timeout * 1000))
+    return query[:match.end()] + hint + query[match.end():], True
+
+
+class Watch(object):
+    """A query watched by a `Watchdog`, killed at its deadline unless
+    cancelled first."""
+
+    def __init__(self, thread_id, connect):
+        self.thread_id = thread_id
+        self.fired = False
+        self.done = False
+        self._connect = connect
+        self._lock = threading.Lock()
+
+    def cancel(self):
+        # Waits for a KILL in flight, so that it cannot hit the next query
+        # issued on the same connection.
+        with self._lock:
+            self.done = True
+
+    def _kill(self):
+        with self._lock:
+            if self.done:
+                return
+            self.done = True
+            self.fired = True
+            try:
+                db = self._connect()
+                try:
+                    cursor = db.cursor()
+                    cursor.execute("KILL QUERY %d" % self.thread_id)
+                    cursor.close()
+                finally:
+                    db.close()
+            except Exception:
+                logger.warning("Cannot kill MySQL thread %d", self.thread_id, exc_info=True)
+
+
+class Watchdog(object):
+    """One thread tracking the deadlines of every watched query in a heap.
+
+    Overrunning queries are killed with ``KILL QUERY`` from a side
+    connection, each on a short-lived thread so that a slow connect does
+    not delay the other deadlines.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._heap = []
+        self._counter = itertools.count()
+        self._compact_at = 1024
+        self._thread = None
+
+    def watch(self, timeout, thread_id, connect):
+        """Returns a `Watch` for a query on MySQL thread ``thread_id`` that
+        is killed through ``connect()`` after ``timeout`` seconds.
+        """
+        watch = Watch(thread_id, connect)
+        with self._cond:
+            if len(self._heap) >= self._compact_at:
+                # Cancelled watches are otherwise only dropped at their
+                # deadline.
+                self._heap = [entry for entry in self._heap if not entry[2].done]
+                heapq.heapify(self._heap)
+                self._compact_at = max(1024, 2 * len(self._heap))
+            heapq.heappush(self._heap, (time.time() + timeout, next(self._counter), watch))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="Watchdog")
+                self._thread.daemon = True
+                self._thread.start()
+            elif self._heap[0][2] is watch:
+                self._cond.notify()
+        return watch
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    while self._heap and self._heap[0][2].done:
+                        heapq.heappop(self._heap)
+                    if not self._heap:
+                        self._cond.wait()
+                        continue
+                    wait = self._heap[0][0] - time.time()
+                    if wait <= 0:
+                        watch = heapq.heappop(self._heap)[2]
+                        break
+                    self._cond.wait(wait)
+            killer = threading.Thread(target=watch._kill, name="Watchdog-kill")
+            killer.daemon = True
+            killer.start()
+
+
+WATCHDOG = Watchdog()
+
+
+class DeadlineMixin(object):
+    """Per-connection and per-call query deadlines.
+
+    Classes using this set ``query_timeout`` (seconds or None) and
+    ``_deadline``, and implement ``_thread_id()`` and ``_side_connection()``,
+    the latter opening a new raw connection to the same server.
+    """
+
+    query_timeout = None
+    _deadline = None
+
+    @contextmanager
+    def deadline(self, seconds):
+        """A context manager bounding the total run time of the queries
+        issued inside it. Overrunning queries raise `QueryTimeoutError`.
+        """
+        previous = self._deadline
+        deadline = time.time() + seconds
+        if previous is not None:
+            deadline = min(deadline, previous)
+        self._deadline = deadline
+        try:
+            yield self
+        finally:
+            self._deadline = previous
+
+    def _time_left(self):
+        timeout = self.query_timeout
+        if self._deadline is not None:
+            left = self._deadline - time.time()
+            if left <= 0:
+                raise QueryTimeoutError("Deadline exceeded before query started")
+            timeout = left if timeout is None else min(timeout, left)
+        return timeout
+
+    @contextmanager
+    def _enforce_deadline(self, query):
+        """Yields the query to run, rewritten to carry its deadline, and
+        cancels it server-side if it overruns.
+        """
+        timeout = self._time_left()
+        if timeout is None:
+            yield query
+            return
+        query, hinted = add_max_execution_time(query, timeout)
+        watch = None
+        if not hinted:
+            watch = WATCHDOG.watch(timeout, self._thread_id(), self._side_connection)
+        try:
+            yield query
+        except Exception as e:
+            if watch is not None:
+                watch.cancel()
+            if (watch is not None and watch.fired) or error_code(e) == ER_QUERY_TIMEOUT:
+                raise QueryTimeoutError(
+                    "Query exceeded its deadline of {:.3f}s".format(timeout)) from e
+            raise
+        finally:
+            if watch is not None:
+                watch.cancel()
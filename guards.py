@@ -0,0 +1,100 @@
+DRAIN_ROWS = 100
+
+
+class ResultTooLargeError(Exception):
+    """Raised when a result set passes a ``max_rows`` or ``max_bytes`` limit.
+    Reading stops at the limit instead of fetching the whole result."""
+
+
+class MultipleRowsError(ResultTooLargeError):
+    """Raised by ``get()`` as soon as a second row is read."""
+
+
+def row_size(row):
+    """Estimates the decoded size of a row: the length of string and bytes
+    values, and 8 bytes for anything else.
+    """
+    if isinstance(row, dict):
+        row = row.values()
+    size = 0
+    for value in row:
+        if isinstance(value, (str, bytes, bytearray)):
+            size += len(value)
+        else:
+            size += 8
+    return size
+
+
+class SizeGuard(object):
+    """Counts rows and bytes against optional limits. ``rows_error`` is the
+    exception raised when ``max_rows`` is passed, if not the default one."""
+
+    def __init__(self, max_rows=None, max_bytes=None, rows_error=None):
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.rows_error = rows_error
+        self.rows = 0
+        self.bytes = 0
+
+    def __bool__(self):
+        return self.max_rows is not None or self.max_bytes is not None
+
+    def check(self, row):
+        """Accounts for one more row, raising `ResultTooLargeError` if it
+        does not fit within the limits.
+        """
+        if self.max_rows is not None and self.rows >= self.max_rows:
+            if self.rows_error is not None:
+                raise self.rows_error
+            raise ResultTooLargeError("Result has more than {} rows".format(self.max_rows))
+        if self.max_bytes is not None:
+            self.bytes += row_size(row)
+            if self.bytes > self.max_bytes:
+                raise ResultTooLargeError("Result is larger than {} bytes".format(self.max_bytes))
+        self.rows += 1
+
+
+def fetch_limited(cursor, guard, reset=None, batch_size=100):
+    """Reads all rows from an unbuffered cursor, never fetching more than
+    one row past ``guard.max_rows``. When a limit is passed and ``reset``
+    is given, the cursor is `discard`-ed before raising.
+    """
+    rows = []
+    try:
+        while True:
+            size = batch_size
+            if guard.max_rows is not None:
+                size = max(1, min(size, guard.max_rows + 1 - len(rows)))
+            chunk = cursor.fetchmany(size)
+            if not chunk:
+                return rows
+            for row in chunk:
+                guard.check(row)
+                rows.append(row)
+    except ResultTooLargeError:
+        if reset is not None:
+            discard(cursor, reset)
+        raise
+
+
+def discard(cursor, reset, drain_rows=DRAIN_ROWS):
+    """Gets a connection with a partly read unbuffered result back into a
+    usable state. Short remainders are drained; otherwise ``reset()`` is
+    called to drop the connection, which is cheaper than reading the rest
+    of a huge result. Inside a transaction, dropping it loses the
+    transaction.
+    """
+    try:
+        if len(cursor.fetchmany(drain_rows)) < drain_rows:
+            return
+    except Exception:
+        pass
+    reset()
+
+
+def close_cursor(cursor):
+    """Closes a cursor that may belong to a connection `discard` reset."""
+    try:
+        cursor.close()
+    except Exception:
+        pass
@@ -0,0 +1,52 @@
+class Interner(object):
+    """Makes equal values in the selected columns of one result set share a
+    single object, so repeated strings are only kept in memory once.
+
+    Only ``str`` and ``bytes`` values are interned. Other types can compare
+    equal while being distinguishable (``Decimal('1.0')`` and
+    ``Decimal('1.00')``, ``0.0`` and ``-0.0``, ``1`` and ``True``), and are
+    left alone.
+
+    ``columns`` is a list of column names, or True for every column. In
+    the True mode a column stops being interned once it has more than
+    ``max_distinct`` distinct values, so only low-cardinality columns pay
+    for the lookup table.
+    """
+
+    def __init__(self, names, columns=True, max_distinct=1024):
+        auto = columns is True
+        self.max_distinct = max_distinct if auto else None
+        self._tables = [(i, name, {}) for i, name in enumerate(names)
+                        if auto or name in columns]
+        self._overflow = False
+
+    def __call__(self, values):
+        """Returns the values of a row with the selected columns interned."""
+        if not self._tables:
+            return values
+        values = list(values)
+        for i, _, table in self._tables:
+            values[i] = self._intern(table, values[i])
+        if self._overflow:
+            self._prune()
+        return values
+
+    def intern_dict(self, row):
+        """Interns the selected columns of a dict row in place."""
+        for _, name, table in self._tables:
+            row[name] = self._intern(table, row[name])
+        if self._overflow:
+            self._prune()
+        return row
+
+    def _intern(self, table, value):
+        if type(value) is not str and type(value) is not bytes:
+            return value
+        shared = table.setdefault(value, value)
+        if self.max_distinct and len(table) > self.max_distinct:
+            self._overflow = True
+        return shared
+
+    def _prune(self):
+        self._tables = [t for t in self._tables if len(t[2]) <= self.max_distinct]
+        self._overflow = False
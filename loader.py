@@ -0,0 +1,138 @@
+from .backend import Connection
+from .upsert import chunked, quote_identifier
+
+
+def _spreads_params(db):
+    # backend and mysqldb connections take query(sql, *params), while
+    # PyMySQLConn takes query(sql, args).
+    cls = db.cnx_class if hasattr(db, "add_connection") else type(db)
+    if isinstance(cls, type) and issubclass(cls, Connection):
+        return True
+    try:
+        from .pymysql_conn import PyMySQLConn
+    except ImportError:
+        PyMySQLConn = None
+    if PyMySQLConn is not None and isinstance(cls, type) and issubclass(cls, PyMySQLConn):
+        return False
+    raise TypeError("Loader needs a backend.Connection, mysqldb.Connection or PyMySQLConn, "
+                    "or a pool.Pool of them, not {!r}".format(cls))
+
+
+class Deferred(object):
+    """A row lookup scheduled on a `Loader`; `get` runs the pending batch."""
+    __slots__ = ("loader", "key")
+
+    def __init__(self, loader, key):
+        self.loader = loader
+        self.key = key
+
+    def __repr__(self):
+        return "<Deferred {}={!r}>".format(self.loader.key, self.key)
+
+    def get(self):
+        """Returns the row for this key, or None if there is none."""
+        cache = self.loader._cache
+        if self.key not in cache:
+            self.loader.dispatch()
+        return cache.get(self.key)
+
+
+class Loader(object):
+    """Coalesces point lookups on ``table`` by ``key`` into chunked
+    ``WHERE key IN (...)`` queries.
+
+    Keys passed to `load` are queued until a result is needed, then
+    fetched together; rows are memoized for the life of the loader, so
+    create one per request. Keys are compared with the values the driver
+    returns, so pass them with the column's Python type.
+
+    ``db`` is a `mysqldb.Connection`, `backend.Connection` or `PyMySQLConn`
+    (with a dict cursor class), or a `pool.Pool` of them. Loaders are not
+    thread-safe.
+    """
+
+    def __init__(self, db, table, key="id", columns="*", chunk_size=500):
+        self.db = db
+        self.table = table
+        self.key = key
+        self.chunk_size = chunk_size
+        self.queries = 0
+        self._spread = _spreads_params(db)
+        if columns == "*":
+            select = "*"
+        else:
+            if key not in columns:
+                columns = [key] + list(columns)
+            select = ", ".join(quote_identifier(c) for c in columns)
+        self._sql = "SELECT {} FROM {} WHERE {} IN ".format(
+            select, quote_identifier(table), quote_identifier(key))
+        self._cache = {}
+        self._pending = {}
+
+    def __repr__(self):
+        return "<Loader {}.{} cached={} pending={}>".format(
+            self.table, self.key, len(self._cache), len(self._pending))
+
+    def load(self, key):
+        """Schedules a lookup of ``key`` and returns a `Deferred` for it."""
+        if key not in self._cache:
+            self._pending[key] = None
+        return Deferred(self, key)
+
+    def load_many(self, keys):
+        """Returns the rows for ``keys`` in the same order, None for keys
+        that have no row.
+        """
+        keys = list(keys)
+        for key in keys:
+            if key not in self._cache:
+                self._pending[key] = None
+        if self._pending:
+            self.dispatch()
+        return [self._cache.get(key) for key in keys]
+
+    def get(self, key):
+        """Returns the row for ``key``, fetching it with any other pending keys."""
+        return self.load(key).get()
+
+    def prime(self, key, row):
+        """Stores a row fetched elsewhere so it is not queried again."""
+        self._cache[key] = row
+        self._pending.pop(key, None)
+
+    def clear(self, key=None):
+        """Forgets one memoized key, or all of them."""
+        if key is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(key, None)
+
+    def dispatch(self):
+        """Fetches every pending key. Keys of a chunk whose query fails stay
+        pending, so the next `get` retries them.
+        """
+        keys = list(self._pending)
+        for chunk in chunked(keys, self.chunk_size):
+            sql = self._sql + "(" + ", ".join(["%s"] * len(chunk)) + ")"
+            found = {}
+            for row in self._query(sql, chunk):
+                found.setdefault(row[self.key], row)
+            for key in chunk:
+                self._cache[key] = found.get(key)
+                self._pending.pop(key, None)
+
+    def _query(self, sql, params):
+        self.queries += 1
+        db = self.db
+        if hasattr(db, "add_connection"):
+            conn = db.get_connection()
+            try:
+                return self._run(conn, sql, params)
+            finally:
+                db.add_connection(conn)
+        return self._run(db, sql, params)
+
+    def _run(self, conn, sql, params):
+        if self._spread:
+            return conn.query(sql, *params)
+        return conn.query(sql, params)
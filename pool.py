@@ -1,18 +1,12 @@
 import threading
 import queue
 
-try:
-    import MySQLdb
-except ImportError:
-    import pymysql
-    pymysql.install_as_MySQLdb()
-
 
 CONNECTION_POOL_LOCK = threading.RLock()
 CNX_POOL_MAXSIZE = 32
 
 
-class PoolError(MySQLdb.Error):
+class PoolError(Exception):
     pass
 
 
@@ -107,14 +101,17 @@ class Pool(object):
             while cnxq.qsize():
                 try:
                     cnx = cnxq.get(block=False)
-                    cnx.close()
-                    cnt += 1
                 except queue.Empty:
                     return cnt
+                try:
+                    cnx.close()
+                    cnt += 1
                 except PoolError:
                     raise
-                except MySQLdb.Error:
-                    pass
+                except Exception as err:
+                    # Errors of whichever driver the connection class uses.
+                    if not isinstance(err, getattr(cnx, "Error", ())):
+                        raise
 
             return cnt
 
@@ -0,0 +1,267 @@
+import json
+import logging
+import queue
+import random
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_STRING_RE = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\"", re.S)
+_COMMENT_RE = re.compile(r"/\*.*?\*/|--[^\n]*|#[^\n]*", re.S)
+_PARAM_RE = re.compile(r"%\(\w+\)s|%s|(?<!:):\w+")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?(?:e[+-]?\d+)?\b", re.I)
+_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_ROWS_RE = re.compile(r"\(\?\+\)(?:\s*,\s*\(\?\+\))+")
+_SPACE_RE = re.compile(r"\s+")
+
+_EXPLAINABLE = ("select", "insert", "update", "delete", "replace", "with")
+
+
+def fingerprint(query):
+    """Normalizes a query so that statements differing only in literals,
+    placeholders, IN-list lengths, comments or whitespace compare equal.
+    """
+    query = _STRING_RE.sub("?", query)
+    query = _COMMENT_RE.sub(" ", query)
+    query = _PARAM_RE.sub("?", query)
+    query = _NUMBER_RE.sub("?", query)
+    query = _LIST_RE.sub("(?+)", query)
+    query = _ROWS_RE.sub("(?+)", query)
+    return _SPACE_RE.sub(" ", query).strip().lower()
+
+
+def plan_summary(plan):
+    """Walks an ``EXPLAIN FORMAT=JSON`` document. Returns the set of flags
+    among ``full_scan``, ``filesort`` and ``temporary`` and the list of
+    ``(table, access_type, key)`` tuples, in plan order.
+    """
+    flags = set()
+    tables = []
+
+    def walk(node):
+        if isinstance(node, dict):
+            if node.get("access_type") == "ALL":
+                flags.add("full_scan")
+            if node.get("using_filesort"):
+                flags.add("filesort")
+            if node.get("using_temporary_table"):
+                flags.add("temporary")
+            if "table_name" in node:
+                tables.append((node["table_name"], node.get("access_type"), node.get("key")))
+            for value in node.values():
+                walk(value)
+        elif isinstance(node, list):
+            for value in node:
+                walk(value)
+
+    walk(plan)
+    return flags, tables
+
+
+class SideExplain(object):
+    """An ``explain`` for `ExplainProfiler.observe` that runs on a DB-API
+    side connection from ``connect()``. The profiler opens one such
+    connection per ``key`` (the server and database) and reuses it.
+    """
+
+    def __init__(self, key, connect, query, args):
+        self.key = key
+        self.connect = connect
+        self.query = query
+        self.args = args
+
+    def __call__(self, prefix, db):
+        cursor = db.cursor()
+        try:
+            cursor.execute(prefix + self.query, self.args)
+            row = cursor.fetchone()
+        finally:
+            cursor.close()
+        return next(iter(row.values())) if isinstance(row, dict) else row[0]
+
+
+class ExplainProfiler(object):
+    """Collects ``EXPLAIN FORMAT=JSON`` plans of slow queries.
+
+    Queries slower than ``threshold`` seconds are counted per fingerprint,
+    and a ``sample_rate`` fraction of them is explained on a side
+    connection. The EXPLAINs run on a background thread, at most
+    ``max_queue`` waiting; samples beyond that are skipped. Attach one
+    profiler to any number of connections by setting their ``profiler``
+    attribute; it is thread-safe.
+    """
+
+    def __init__(self, threshold=0.1, sample_rate=0.1, max_plans=5, max_queue=100):
+        self.threshold = threshold
+        self.sample_rate = sample_rate
+        self.max_plans = max_plans
+        self.skipped = 0
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._jobs = queue.Queue(max_queue)
+        self._thread = None
+        self._closed = False
+        # Side connections by key, only used by the worker thread.
+        self._side = {}
+
+    def __repr__(self):
+        return "<ExplainProfiler fingerprints={}>".format(len(self._entries))
+
+    def observe(self, query, elapsed, explain):
+        """Records a finished query. ``explain`` is a `SideExplain`, or an
+        ``explain(prefix)`` callable that runs the query with ``prefix``
+        prepended on a side connection and returns the first column of the
+        first row. Either is called later, on the worker thread.
+        """
+        if elapsed < self.threshold or not isinstance(query, str):
+            return
+        fp = fingerprint(query)
+        with self._lock:
+            entry = self._entries.get(fp)
+            if entry is None:
+                entry = self._entries[fp] = {
+                    "fingerprint": fp,
+                    "example": query,
+                    "slow_calls": 0,
+                    "total_time": 0.0,
+                    "max_time": 0.0,
+                    "explained": 0,
+                    "flags": set(),
+                    "plans": [],
+                }
+            entry["slow_calls"] += 1
+            entry["total_time"] += elapsed
+            entry["max_time"] = max(entry["max_time"], elapsed)
+            if (self._closed or random.random() >= self.sample_rate
+                    or not fp.startswith(_EXPLAINABLE)):
+                return
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="ExplainProfiler")
+                self._thread.daemon = True
+                self._thread.start()
+        try:
+            self._jobs.put_nowait((entry, explain))
+        except queue.Full:
+            with self._lock:
+                self.skipped += 1
+
+    def _run(self):
+        while True:
+            entry, explain = self._jobs.get()
+            try:
+                if entry is None:
+                    return
+                self._explain(entry, explain)
+            finally:
+                self._jobs.task_done()
+
+    def _explain(self, entry, explain):
+        try:
+            if isinstance(explain, SideExplain):
+                db = self._side.get(explain.key)
+                if db is None:
+                    db = self._side[explain.key] = explain.connect()
+                try:
+                    plan = explain("EXPLAIN FORMAT=JSON ", db)
+                except Exception:
+                    # Reconnect for the next sample.
+                    self._close_side(explain.key)
+                    raise
+            else:
+                plan = explain("EXPLAIN FORMAT=JSON ")
+            plan = json.loads(plan)
+        except Exception:
+            logger.warning("Cannot explain query %s", entry["fingerprint"], exc_info=True)
+            return
+        flags, tables = plan_summary(plan)
+        with self._lock:
+            entry["explained"] += 1
+            entry["flags"].update(flags)
+            if tables not in entry["plans"]:
+                entry["plans"].append(tables)
+                del entry["plans"][:-self.max_plans]
+
+    def _close_side(self, key):
+        db = self._side.pop(key, None)
+        if db is not None:
+            try:
+                db.close()
+            except Exception:
+                pass
+
+    def flush(self):
+        """Waits until every queued EXPLAIN has run."""
+        self._jobs.join()
+
+    def close(self):
+        """Runs the queued EXPLAINs, then stops the worker thread and closes
+        its side connections.
+        """
+        with self._lock:
+            self._closed = True
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._jobs.put((None, None))
+            thread.join()
+        for key in list(self._side):
+            self._close_side(key)
+
+    def report(self, timings=True):
+        """Returns the collected entries as a list sorted by fingerprint.
+        With ``timings=False`` the report only changes when plans do.
+        EXPLAINs still queued are not included; see `flush`.
+        """
+        with self._lock:
+            entries = [dict(e, flags=set(e["flags"]), plans=list(e["plans"]))
+                       for e in self._entries.values()]
+        report = []
+        for entry in sorted(entries, key=lambda e: e["fingerprint"]):
+            entry["flags"] = sorted(entry["flags"])
+            entry["plans"] = [[list(t) for t in plan] for plan in entry["plans"]]
+            if not timings:
+                for key in ("example", "slow_calls", "total_time", "max_time", "explained"):
+                    del entry[key]
+            report.append(entry)
+        return report
+
+    def write_report(self, path, timings=False):
+        """Writes `report` as stable, diffable JSON to ``path``, once the
+        queued EXPLAINs have run.
+        """
+        self.flush()
+        with open(path, "w") as f:
+            json.dump(self.report(timings=timings), f, indent=2, sort_keys=True)
+            f.write("\n")
+
+    def reset(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class ObserverMixin(object):
+    """Feeds every finished statement to an optional ``profiler`` (an
+    `ExplainProfiler`) and ``recorder`` (a `workload.WorkloadRecorder`).
+
+    Classes using this implement ``_explainer(query, args)``, returning
+    the ``explain`` given to `ExplainProfiler.observe`.
+    """
+
+    profiler = None
+    recorder = None
+
+    @property
+    def _observed(self):
+        return self.profiler is not None or self.recorder is not None
+
+    def _observe(self, query, args, start):
+        # Observers must never fail the statement they watch.
+        elapsed = time.time() - start
+        try:
+            if self.recorder is not None:
+                self.recorder.record(id(self), query, args, start, elapsed)
+            if self.profiler is not None:
+                self.profiler.observe(query, elapsed, self._explainer(query, args))
+        except Exception:
+            logger.warning("Cannot observe query", exc_info=True)
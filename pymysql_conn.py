@@ -2,17 +2,32 @@ import time
 from contextlib import contextmanager
 
 import pymysql
+import pymysql.converters
 import pymysql.cursors
+import pymysql.err
 from pymysql.connections import Connection
 
+from .breaker import get_breaker
+from .converters import build_conversions
+from .deadline import DeadlineMixin
+from .guards import MultipleRowsError, SizeGuard, close_cursor, fetch_limited
+from .interning import Interner
+from .profiler import ObserverMixin, SideExplain
+from .retry import DEFAULT_RETRY_POLICY, lost_transaction
+from .upsert import upsert
 
-class PyMySQLConn(Connection):
+
+class PyMySQLConn(DeadlineMixin, ObserverMixin, Connection):
     """ A lightweight wrapper around PyMySQL DB-API connections. """
 
+    _needs_reconnect = False
+    _in_transaction = False
+
     def __init__(self, host, db, user=None, password=None,
                  charset="utf8", time_zone="+8:00", sql_mode="TRADITIONAL",
                  health_check_interval=300, cursorclass=pymysql.cursors.DictCursor,
-                 **kwargs):
+                 query_timeout=None, converters="default",
+                 max_result_rows=None, max_result_bytes=None, **kwargs):
 
         pair = host.split(":")
         if len(pair) == 2:
@@ -22,7 +37,12 @@ class PyMySQLConn(Connection):
             kwargs["host"] = host
             kwargs["port"] = 3306
 
+        kwargs.setdefault("conv", build_conversions(pymysql.converters.conversions, converters))
+
         self.health_check_interval = health_check_interval
+        self.query_timeout = query_timeout
+        self.max_result_rows = max_result_rows
+        self.max_result_bytes = max_result_bytes
         self.next_health_check = 0
         self.check_health()
         super(PyMySQLConn, self).__init__(db=db, user=user, passwd=password, charset=charset,
@@ -35,61 +55,166 @@ class PyMySQLConn(Connection):
             self.ping(reconnect=True)
             self.next_health_check = time.time() + self.health_check_interval
 
+    def connect(self, sock=None):
+        """Opens the connection through the host's shared `breaker.HostBreaker`,
+        failing fast with `breaker.CircuitOpenError` while the host is down.
+        """
+        breaker = get_breaker(self.host, self.port)
+        return breaker.connect(lambda: super(PyMySQLConn, self).connect(sock),
+                               pymysql.err.OperationalError)
+
     @contextmanager
     def transaction(self):
         """A context manager for executing a transaction on this Database."""
+        self._ensure_open()
         self.begin()
+        self._in_transaction = True
         try:
             yield self
+            self._check_transaction()
             self.commit()
         except Exception:
-            self.rollback()
+            try:
+                self.rollback()
+            except pymysql.err.Error:
+                pass
             raise
+        finally:
+            self._in_transaction = False
 
-    def cursor(self, cursor=None):
+    def _autocommit(self):
+        # Statements commit one by one, except inside `transaction`.
+        if not self._in_transaction:
+            self.commit()
+
+    def run_transaction(self, func, policy=None):
+        """Runs ``func(self)`` in a transaction and returns its result.
+
+        Deadlocks and lock wait timeouts re-run the whole transaction with
+        jittered exponential backoff according to ``policy`` (a
+        `retry.RetryPolicy`, shared `retry.DEFAULT_RETRY_POLICY` by default),
+        whose ``stats`` count the retries.
+        """
+        return (policy or DEFAULT_RETRY_POLICY).run(self.transaction, func)
+
+    def _check_transaction(self):
+        if self._in_transaction and not self.open:
+            raise lost_transaction(pymysql.err.OperationalError)
+
+    def _ensure_open(self):
+        if self._needs_reconnect:
+            self._needs_reconnect = False
+            self.ping(reconnect=True)
         self.check_health()
+
+    def cursor(self, cursor=None):
+        self._check_transaction()
+        self._ensure_open()
         return super(PyMySQLConn, self).cursor(cursor=cursor)
 
+    def _unbuffered_cursor(self):
+        if issubclass(self.cursorclass, pymysql.cursors.DictCursorMixin):
+            return self.cursor(pymysql.cursors.SSDictCursor)
+        return self.cursor(pymysql.cursors.SSCursor)
+
+    def _reset(self):
+        # The next cursor() or transaction() reconnects.
+        try:
+            self.close()
+        except pymysql.err.Error:
+            pass
+        self._needs_reconnect = True
+
+    def _execute(self, cursor, query, args, guard=None):
+        start = time.time()
+        with self._enforce_deadline(query) as sql:
+            result = cursor.execute(sql, args=args)
+            if guard:
+                result = fetch_limited(cursor, guard, self._reset)
+        if self._observed:
+            self._observe(query, args, start)
+        return result
+
+    def _explainer(self, query, args):
+        return SideExplain((self.host, self.port, self.db), self._side_connection, query, args)
+
+    def _thread_id(self):
+        return self.thread_id()
+
+    def _side_connection(self):
+        return pymysql.connect(host=self.host, port=self.port, user=self.user,
+                               password=self.password, database=self.db,
+                               charset=self.charset, connect_timeout=self.connect_timeout)
+
     def iter(self, sql, args=None):
         """Returns an iterator for the given query and parameters."""
         cursor = self.cursor(pymysql.cursors.SSCursor)
-        cursor.execute(sql, args=args)
+        self._execute(cursor, sql, args)
         for row in cursor:
             yield row
 
-    def query(self, query, args=None):
-        """Returns a row list for the given query and parameters."""
-        with self.cursor() as cursor:
-            cursor.execute(query, args=args)
-            return cursor.fetchall()
+    def query(self, query, args=None, intern_columns=None, max_rows=None, max_bytes=None):
+        """Returns a row list for the given query and parameters.
 
-    def get(self, query, args):
+        ``intern_columns`` (a list of column names, or True for every
+        low-cardinality column) makes equal values in those columns share
+        one object across the returned rows.
+
+        ``max_rows`` and ``max_bytes`` default to the connection's
+        ``max_result_rows`` and ``max_result_bytes``. When either is set the
+        result is read unbuffered and `guards.ResultTooLargeError` is
+        raised as soon as it passes a limit.
+        """
+        guard = SizeGuard(self.max_result_rows if max_rows is None else max_rows,
+                          self.max_result_bytes if max_bytes is None else max_bytes)
+        cursor = self._unbuffered_cursor() if guard else self.cursor()
+        try:
+            rows = self._execute(cursor, query, args, guard)
+            if not guard:
+                rows = cursor.fetchall()
+            if intern_columns and rows:
+                interner = Interner([d[0] for d in cursor.description], intern_columns)
+                if isinstance(rows[0], dict):
+                    for row in rows:
+                        interner.intern_dict(row)
+                else:
+                    rows = [type(row)(interner(row)) for row in rows]
+            return rows
+        finally:
+            if guard:
+                close_cursor(cursor)
+            else:
+                cursor.close()
+
+    def get(self, query, args, max_bytes=None):
         """Returns the (singular) row returned by the given query.
 
         If the query has no results, returns None.  If it has
-        more than one result, raises an exception.
+        more than one result, raises `guards.MultipleRowsError` as soon
+        as the second row is read.
         """
-        rows = self.query(query, args=args)
-        if not rows:
-            return None
-        elif len(rows) > 1:
-            raise Exception("Multiple rows returned for get() query")
-        else:
-            return rows[0]
+        guard = SizeGuard(1, self.max_result_bytes if max_bytes is None else max_bytes,
+                          MultipleRowsError("Multiple rows returned for get() query"))
+        cursor = self._unbuffered_cursor()
+        try:
+            rows = self._execute(cursor, query, args, guard)
+            return rows[0] if rows else None
+        finally:
+            close_cursor(cursor)
 
     def execute_lastrowid(self, query, args=None):
         with self.cursor() as c:
-            c.execute(query, args=args)
+            self._execute(c, query, args)
             lastrowid = c.lastrowid
-            self.commit()
+            self._autocommit()
             return lastrowid
 
     def execute_rowcount(self, query, args=None):
         """Executes the given query, returning the rowcount from the query."""
         with self.cursor() as c:
-            c.execute(query, args=args)
+            self._execute(c, query, args)
             rowcount = c.rowcount
-            self.commit()
+            self._autocommit()
             return rowcount
 
     def executemany_rowcount(self, query, args):
@@ -97,11 +222,21 @@ class PyMySQLConn(Connection):
         return the rowcount from the query.
         """
         with self.cursor() as cursor:
-            cursor.executemany(query, args)
+            with self._enforce_deadline(query) as query:
+                cursor.executemany(query, args)
             rowcount = cursor.rowcount
-            self.commit()
+            self._autocommit()
             return rowcount
 
+    def upsert(self, table, keys, rows, update=None, chunk_size=500):
+        """Inserts or updates the given dict rows into ``table`` using chunked
+        ``INSERT ... ON DUPLICATE KEY UPDATE`` statements, committing each chunk.
+
+        Returns a list of per-chunk ``{"rows", "affected", "inserted", "updated"}`` counts.
+        """
+        return upsert(self.execute_rowcount, table, keys, rows,
+                      update=update, chunk_size=chunk_size)
+
     insert = execute_lastrowid
     update = delete = execute_rowcount
     updatemany = executemany_rowcount
@@ -1,7 +1,10 @@
 # -*- coding: utf-8 -*-
+import pprint
 from collections import OrderedDict
 from inspect import isclass
 
+from .guards import ResultTooLargeError, SizeGuard
+
 
 def is_exception(obj):
     """Given an object, return a boolean indicating whether it is an instance
@@ -14,6 +17,19 @@ def is_exception(obj):
     return False
 
 
+class Row(dict):
+    """A dict that allows for object-like property access syntax."""
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __repr__(self):
+        return "<Row({})>".format(pprint.pformat(self, indent=2))
+
+
 class Record(object):
     """A row, from a query, from a database."""
     __slots__ = ('_keys', '_values')
@@ -76,15 +92,39 @@ class Record(object):
 
 
 class RecordCollection(object):
-    """A set of excellent Records from a query."""
-    def __init__(self, rows):
+    """A set of excellent Records from a query.
+
+    With ``cache=False`` rows are not kept once yielded, so the collection
+    can only be iterated once, front to back, in constant memory. Its
+    `first`, `one` and `scalar` read the next rows and then close it.
+
+    ``max_rows`` and ``max_bytes`` make iteration raise
+    `guards.ResultTooLargeError` at the first row past a limit; the row
+    source is then aborted rather than read to the end.
+    """
+    def __init__(self, rows, cache=True, max_rows=None, max_bytes=None):
         self._rows = rows
         self._all_rows = []
+        self._cache = cache
+        self._guard = SizeGuard(max_rows, max_bytes)
         self.pending = True
 
     def __repr__(self):
         return '<RecordCollection size={} pending={}>'.format(len(self), self.pending)
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc, val, traceback):
+        self.close()
+
+    def close(self):
+        """Stops fetching rows, releasing whatever the row source holds."""
+        close = getattr(self._rows, 'close', None)
+        if close is not None:
+            close()
+        self.pending = False
+
     def __iter__(self):
         """Iterate over all rows, consuming the underlying generator
         only when necessary."""
@@ -109,13 +149,28 @@ class RecordCollection(object):
     def __next__(self):
         try:
             nextrow = next(self._rows)
-            self._all_rows.append(nextrow)
+            if self._guard:
+                self._check(nextrow)
+            if self._cache:
+                self._all_rows.append(nextrow)
             return nextrow
         except StopIteration:
             self.pending = False
             raise StopIteration('RecordCollection contains no more rows.')
 
+    def _check(self, row):
+        try:
+            self._guard.check(row.values() if isinstance(row, Record) else row)
+        except ResultTooLargeError:
+            abort = getattr(self._rows, 'abort', None) or getattr(self._rows, 'close', None)
+            self.pending = False
+            if abort is not None:
+                abort()
+            raise
+
     def __getitem__(self, key):
+        if not self._cache:
+            raise TypeError('Uncached RecordCollection can only be iterated.')
         is_int = isinstance(key, int)
 
         # Convert RecordCollection[1] into slice.
@@ -137,6 +192,15 @@ class RecordCollection(object):
     def __len__(self):
         return len(self._all_rows)
 
+    def _take(self, index):
+        # An uncached collection cannot go back, so it reads the next row.
+        if self._cache:
+            return self[index]
+        try:
+            return next(self)
+        except StopIteration:
+            raise IndexError(index)
+
     def all(self, as_dict=False, as_ordereddict=False):
         """Returns a list of all rows for the RecordCollection. If they haven't
         been fetched yet, consume the iterator and cache the results."""
@@ -161,11 +225,14 @@ class RecordCollection(object):
 
         # Try to get a record, or return/raise default.
         try:
-            record = self[0]
+            record = self._take(0)
         except IndexError:
             if is_exception(default):
                 raise default
             return default
+        finally:
+            if not self._cache:
+                self.close()
 
         # Cast and return.
         if as_dict:
@@ -180,23 +247,27 @@ class RecordCollection(object):
         is the only record, or returns `default`. If `default` is an instance
         or subclass of Exception, then raise it instead of returning it."""
 
-        # Try to get a record, or return/raise default.
         try:
-            record = self[0]
-        except IndexError:
-            if is_exception(default):
-                raise default
-            return default
+            # Try to get a record, or return/raise default.
+            try:
+                record = self._take(0)
+            except IndexError:
+                if is_exception(default):
+                    raise default
+                return default
 
-        # Ensure that we don't have more than one row.
-        try:
-            self[1]
-        except IndexError:
-            pass
-        else:
-            raise ValueError('RecordCollection contained more than one row. '
-                             'Expects only one row when using '
-                             'RecordCollection.one')
+            # Ensure that we don't have more than one row.
+            try:
+                self._take(1)
+            except IndexError:
+                pass
+            else:
+                raise ValueError('RecordCollection contained more than one row. '
+                                 'Expects only one row when using '
+                                 'RecordCollection.one')
+        finally:
+            if not self._cache:
+                self.close()
 
         # Cast and return.
         if as_dict:
@@ -0,0 +1,134 @@
+import logging
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+ER_LOCK_WAIT_TIMEOUT = 1205
+ER_LOCK_DEADLOCK = 1213
+RETRYABLE_ERRORS = frozenset([ER_LOCK_WAIT_TIMEOUT, ER_LOCK_DEADLOCK])
+
+CR_SERVER_GONE_ERROR = 2006
+CR_SERVER_LOST = 2013
+# Errors after which the connection itself is unusable, as opposed to
+# errors of one statement or transaction.
+DISCONNECT_ERRORS = frozenset([
+    1053,  # ER_SERVER_SHUTDOWN
+    1927,  # ER_CONNECTION_KILLED
+    CR_SERVER_GONE_ERROR,
+    CR_SERVER_LOST,
+    2055,  # CR_SERVER_LOST_EXTENDED
+    4031,  # ER_CLIENT_INTERACTION_TIMEOUT
+])
+
+
+def error_code(exc):
+    """Returns the MySQL error number carried by a driver exception, if any."""
+    args = getattr(exc, "args", ())
+    if args and isinstance(args[0], int):
+        return args[0]
+    return None
+
+
+
+def lost_transaction(error_class):
+    """Returns the ``error_class`` error raised for a statement inside a
+    transaction whose connection was dropped. Reconnecting instead would
+    run the rest of the transaction outside of it, and its commit would
+    only cover that part.
+    """
+    return error_class(CR_SERVER_LOST, "Lost connection to MySQL server during transaction")
+
+class RetryStats(object):
+    """Thread-safe counters describing transaction contention."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.transactions = 0
+            self.retries = 0
+            self.deadlocks = 0
+            self.lock_wait_timeouts = 0
+            self.exhausted = 0
+
+    def _record_retry(self, code):
+        with self._lock:
+            self.retries += 1
+            if code == ER_LOCK_DEADLOCK:
+                self.deadlocks += 1
+            elif code == ER_LOCK_WAIT_TIMEOUT:
+                self.lock_wait_timeouts += 1
+
+    def _record_done(self, exhausted=False):
+        with self._lock:
+            self.transactions += 1
+            if exhausted:
+                self.exhausted += 1
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                "transactions": self.transactions,
+                "retries": self.retries,
+                "deadlocks": self.deadlocks,
+                "lock_wait_timeouts": self.lock_wait_timeouts,
+                "exhausted": self.exhausted,
+            }
+
+    def __repr__(self):
+        return "<RetryStats {}>".format(self.as_dict())
+
+
+class RetryPolicy(object):
+    """Re-runs a transaction body on deadlocks and lock wait timeouts.
+
+    Attempts are separated by "full jitter" exponential backoff: the n-th
+    retry sleeps a random time between 0 and
+    ``min(max_delay, base_delay * 2 ** n)``. After ``max_retries`` retries
+    the last error is raised.
+    """
+
+    def __init__(self, max_retries=5, base_delay=0.05, max_delay=2.0,
+                 errors=RETRYABLE_ERRORS, stats=None):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.errors = frozenset(errors)
+        self.stats = stats if stats is not None else RetryStats()
+
+    def delay(self, attempt):
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def run(self, transaction, func):
+        """Calls ``func(conn)`` inside ``transaction()``, retrying the whole
+        transaction on retryable errors. ``func`` may be called several
+        times, so it must not have side effects outside the database.
+        """
+        attempt = 0
+        while True:
+            try:
+                with transaction() as conn:
+                    result = func(conn)
+            except Exception as e:
+                code = error_code(e)
+                if code not in self.errors:
+                    self.stats._record_done()
+                    raise
+                if attempt >= self.max_retries:
+                    self.stats._record_done(exhausted=True)
+                    raise
+                self.stats._record_retry(code)
+                delay = self.delay(attempt)
+                logger.warning("Retrying transaction after MySQL error %d in %.3fs", code, delay)
+                time.sleep(delay)
+                attempt += 1
+            else:
+                self.stats._record_done()
+                return result
+
+
+DEFAULT_RETRY_POLICY = RetryPolicy()
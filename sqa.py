@@ -1,11 +1,162 @@
+import logging
+import threading
+import time
 from contextlib import contextmanager
 
 import sqlalchemy.engine
 from sqlalchemy import create_engine, exc, inspect, text
 from sqlalchemy.sql.expression import TextClause
 
+from .interning import Interner
+from .profiler import ObserverMixin
 from .records import Record, RecordCollection
 
+logger = logging.getLogger(__name__)
+
+
+class SchemaCache(object):
+    """Lazily loaded table, column, key and index metadata for an engine.
+
+    Entries are loaded on first use and reloaded once they are older than
+    ``ttl`` seconds (never, if ``ttl`` is None) or after `refresh`. One
+    cache is shared by a `Database` and all of its connections.
+    """
+
+    def __init__(self, engine, ttl=300):
+        self._engine = engine
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self._tables = None
+        self._entries = {}
+
+    def __repr__(self):
+        return '<SchemaCache tables={}>'.format(len(self._entries))
+
+    def _fresh(self, loaded_at):
+        return self.ttl is None or time.time() - loaded_at < self.ttl
+
+    def refresh(self, table=None):
+        """Drops the cached metadata of one table, or of everything."""
+        with self._lock:
+            if table is None:
+                self._tables = None
+                self._entries.clear()
+            else:
+                self._entries.pop(table, None)
+
+    def table_names(self):
+        """Returns the list of table names in the database."""
+        with self._lock:
+            if self._tables is None or not self._fresh(self._tables[0]):
+                self._tables = (time.time(), inspect(self._engine).get_table_names())
+            return list(self._tables[1])
+
+    def table(self, table):
+        """Returns a dict with the ``columns``, ``types``, ``primary_key``,
+        ``unique_keys`` and ``indexes`` of ``table``.
+        """
+        with self._lock:
+            entry = self._entries.get(table)
+            if entry is None or not self._fresh(entry[0]):
+                entry = self._entries[table] = (time.time(), self._load(table))
+            return entry[1]
+
+    def _load(self, table):
+        inspector = inspect(self._engine)
+        columns = inspector.get_columns(table)
+        unique_keys = [c['column_names'] for c in inspector.get_unique_constraints(table)]
+        indexes = inspector.get_indexes(table)
+        # MySQL reports unique keys as unique indexes.
+        for index in indexes:
+            if index.get('unique') and index['column_names'] not in unique_keys:
+                unique_keys.append(index['column_names'])
+        return {
+            'columns': [c['name'] for c in columns],
+            'types': dict((c['name'], c['type']) for c in columns),
+            'primary_key': inspector.get_pk_constraint(table)['constrained_columns'],
+            'unique_keys': unique_keys,
+            'indexes': indexes,
+        }
+
+    def columns(self, table):
+        """Returns the column names of ``table``, in table order."""
+        return self.table(table)['columns']
+
+    def column_types(self, table):
+        """Returns a dict of column name to SQLAlchemy type for ``table``."""
+        return self.table(table)['types']
+
+    def primary_key(self, table):
+        """Returns the primary key column names of ``table``."""
+        return self.table(table)['primary_key']
+
+    def unique_keys(self, table):
+        """Returns the column name lists of every unique key of ``table``."""
+        return self.table(table)['unique_keys']
+
+    def indexes(self, table):
+        """Returns the indexes of ``table`` as reported by SQLAlchemy."""
+        return self.table(table)['indexes']
+
+
+class StreamedRows(object):
+    """An iterator of Records fetched ``yield_per`` rows at a time from a
+    streaming result. Closing it, exhausting it or dropping it closes the
+    result and calls ``on_close``. `abort` calls ``on_abort`` first, for a
+    connection that should not be reused with a partly read result.
+    """
+
+    def __init__(self, result_proxy, yield_per=1000, intern_columns=None, on_close=None,
+                 on_abort=None):
+        self._result = result_proxy
+        self._keys = result_proxy.keys()
+        self._interner = Interner(self._keys, intern_columns) if intern_columns else None
+        self._yield_per = yield_per
+        self._on_close = on_close
+        self._on_abort = on_abort
+        self._batch = iter(())
+        self.closed = False
+
+    def __del__(self):
+        self.close()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        row = next(self._batch, None)
+        if row is None:
+            rows = None if self.closed else self._result.fetchmany(self._yield_per)
+            if not rows:
+                self.close()
+                raise StopIteration()
+            self._batch = iter(rows)
+            row = next(self._batch)
+        if self._interner is not None:
+            row = self._interner(row)
+        return Record(self._keys, row)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self._result.close()
+        finally:
+            if self._on_close is not None:
+                self._on_close()
+
+    def abort(self):
+        """Closes without reading the rest of the result."""
+        if self.closed:
+            return
+        if self._on_abort is not None:
+            self._on_abort()
+        try:
+            self.close()
+        except exc.SQLAlchemyError:
+            pass
+
 
 class Database:
     """A Database. Encapsulates a url and an SQLAlchemy engine with a pool of
@@ -14,7 +165,7 @@ class Database:
 
     def __init__(self, db_url, pool_size=5, max_overflow=10,
                  pool_recycle=3600, pool_pre_ping=False,
-                 encoding='utf-8', echo=False, **kwargs):
+                 encoding='utf-8', echo=False, schema_ttl=300, **kwargs):
 
         self.db_url = db_url
         if not self.db_url:
@@ -32,6 +183,11 @@ class Database:
             **kwargs
         )
         self._engine.connect()
+        self.schema = SchemaCache(self._engine, ttl=schema_ttl)
+        # An optional `profiler.ExplainProfiler` and `workload.WorkloadRecorder`
+        # given to every connection.
+        self.profiler = None
+        self.recorder = None
         self.open = True
 
     def close(self):
@@ -51,8 +207,7 @@ class Database:
     def get_table_names(self, internal=False):
         """Returns a list of table names for the connected database."""
 
-        # Setup SQLAlchemy for Database inspection.
-        return inspect(self._engine).get_table_names()
+        return self.schema.table_names()
 
     def get_connection(self):
         """Get a connection to this Database. Connections are retrieved from a
@@ -61,7 +216,8 @@ class Database:
         if not self.open:
             raise exc.ResourceClosedError('Database closed.')
 
-        return Connection(self._engine.connect())
+        return Connection(self._engine.connect(), schema=self.schema,
+                          profiler=self.profiler, recorder=self.recorder)
 
     def query(self, query, *multiparams, **params):
         """Executes the given SQL query against the Database. Parameters can,
@@ -69,7 +225,23 @@ class Database:
         iterated over to get result rows as dictionaries.
         """
         with self.get_connection() as conn:
-            return conn.query(query, *multiparams, **params)
+            results = conn.query(query, *multiparams, **params)
+            # Fetch everything before the connection goes back to the pool.
+            results.all()
+            return results
+
+    def stream(self, query, *multiparams, **params):
+        """Like `query`, but rows are read through a server-side cursor in
+        batches of ``yield_per`` and not kept in memory. The pooled
+        connection is held until the returned RecordCollection is exhausted
+        or closed.
+        """
+        conn = self.get_connection()
+        try:
+            return conn.stream(query, *multiparams, close_connection=True, **params)
+        except Exception:
+            conn.close()
+            raise
 
     def bulk_query(self, query, *multiparams):
         """Bulk insert or update."""
@@ -110,11 +282,15 @@ class Database:
             conn.close()
 
 
-class Connection:
+class Connection(ObserverMixin):
     """A Database connection."""
 
-    def __init__(self, connection: sqlalchemy.engine.Connection):
+    def __init__(self, connection: sqlalchemy.engine.Connection, schema=None,
+                 profiler=None, recorder=None):
         self._conn = connection
+        self.schema = schema
+        self.profiler = profiler
+        self.recorder = recorder
         self.open = not connection.closed
 
     def close(self):
@@ -130,20 +306,57 @@ class Connection:
     def __repr__(self):
         return '<Connection open={}>'.format(self.open)
 
-    def query(self, query, *multiparams, **params):
+    def query(self, query, *multiparams, intern_columns=None, max_rows=None,
+              max_bytes=None, **params):
         """Executes the given SQL query against the connected Database.
         Parameters can, optionally, be provided. Returns a RecordCollection,
         which can be iterated over to get result rows as dictionaries.
+        ``intern_columns`` (a list of column names, or True for every
+        low-cardinality column) makes equal values share one object.
+        ``max_rows`` and ``max_bytes`` raise `guards.ResultTooLargeError`
+        once that many Records have been built; use `stream` to also stop
+        the driver from reading the rest of the result.
         """
 
         # Execute the given query.
         result_proxy = self.execute(query, *multiparams, **params)
-        # Row-by-row Record generator.
-        row_gen = (Record(result_proxy.keys(), row) for row in result_proxy)
+        # Row-by-row Record generator. Results without rows have no keys.
+        if not result_proxy.returns_rows:
+            row_gen = iter(())
+        elif intern_columns:
+            keys = result_proxy.keys()
+            interner = Interner(keys, intern_columns)
+            row_gen = (Record(keys, interner(row)) for row in result_proxy)
+        else:
+            keys = result_proxy.keys()
+            row_gen = (Record(keys, row) for row in result_proxy)
         # Convert psycopg2 results to RecordCollection.
-        results = RecordCollection(row_gen)
+        results = RecordCollection(row_gen, max_rows=max_rows, max_bytes=max_bytes)
         return results
 
+    def stream(self, query, *multiparams, yield_per=1000, intern_columns=None,
+               close_connection=False, max_rows=None, max_bytes=None, **params):
+        """Executes the given SQL query with a server-side cursor and returns
+        an uncached RecordCollection that fetches ``yield_per`` rows at a
+        time. Closing or exhausting it releases the cursor, and also closes
+        this connection if ``close_connection`` is set. Passing ``max_rows``
+        or ``max_bytes`` invalidates the connection, instead of draining
+        it, when the result turns out too large.
+        """
+        if (params or multiparams) and self._has_bind_params(query):
+            query = text(query)
+        conn = self._conn.execution_options(stream_results=True)
+        try:
+            result_proxy = conn.execute(query, *multiparams, **params)
+        except Exception:
+            if close_connection:
+                self.close()
+            raise
+        on_close = self.close if close_connection else None
+        rows = StreamedRows(result_proxy, yield_per, intern_columns, on_close,
+                            on_abort=self._conn.invalidate)
+        return RecordCollection(rows, cache=False, max_rows=max_rows, max_bytes=max_bytes)
+
     def bulk_query(self, query, *multiparams):
         """Bulk insert or update."""
 
@@ -161,10 +374,28 @@ class Connection:
         return bool(TextClause._bind_params_regex.search(query))
 
     def execute(self, query, *multiparams, **params):
+        if not self._observed:
+            return self._execute(query, *multiparams, **params)
+        start = time.time()
+        result_proxy = self._execute(query, *multiparams, **params)
+        self._observe(query, params or multiparams, start)
+        return result_proxy
+
+    def _execute(self, query, *multiparams, **params):
         if (params or multiparams) and self._has_bind_params(query):
             query = text(query)
         return self._conn.execute(query, *multiparams, **params)
 
+    def _explainer(self, query, args):
+        engine = self._conn.engine
+        multiparams, params = ((), args) if isinstance(args, dict) else (args, {})
+
+        def explain(prefix):
+            # Runs on the profiler's thread, on a pooled connection.
+            with Connection(engine.connect()) as side:
+                return side.execute(prefix + query, *multiparams, **params).scalar()
+        return explain
+
     def execute_lastrowid(self, query, *multiparams, **params):
         result_proxy = self.execute(query, *multiparams, **params)
         return result_proxy.lastrowid
@@ -0,0 +1,16 @@
+import os
+import sys
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+try:
+    import torndb  # noqa: F401
+except ImportError:
+    # A checkout that is not named torndb: expose it under that name so
+    # that the relative imports inside it resolve.
+    package = types.ModuleType("torndb")
+    package.__path__ = [ROOT]
+    sys.modules["torndb"] = package
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
@@ -0,0 +1,235 @@
+"""An in-process stand-in for a MySQL driver with InnoDB-like row locks.
+
+Only ``UPDATE counters SET n = n + 1 WHERE id = %s``,
+``SELECT n FROM counters WHERE id = %s`` and ``SELECT id, n FROM counters``
+are understood, optionally prefixed with ``EXPLAIN FORMAT=JSON``, as well
+as ``DO SLEEP(%s)`` and ``KILL QUERY``; that is enough to produce real lock
+waits and deadlocks between threads, large results, plans and
+cancellations.
+"""
+import json
+import threading
+import time
+import types
+
+from torndb.backend import DRIVERS, Driver
+
+
+class Error(Exception):
+    pass
+
+
+class OperationalError(Error):
+    pass
+
+
+class IntegrityError(Error):
+    pass
+
+
+class Server(object):
+
+    def __init__(self, rows, lock_wait_timeout=1.0):
+        self.rows = dict(rows)
+        self.lock_wait_timeout = lock_wait_timeout
+        self.connections = 0
+        self.explains = 0
+        self.kills = 0
+        self._running = {}
+        self._cond = threading.Condition()
+        self._owners = {}
+        self._waiting = {}
+
+    def update(self, txn, row):
+        with self._cond:
+            deadline = time.time() + self.lock_wait_timeout
+            while self._owners.get(row, txn) is not txn:
+                holder = self._owners[row]
+                if self._owners.get(self._waiting.get(holder)) is txn:
+                    self._release(txn)
+                    raise OperationalError(1213, "Deadlock found when trying to get lock")
+                left = deadline - time.time()
+                if left <= 0:
+                    self._waiting.pop(txn, None)
+                    raise OperationalError(1205, "Lock wait timeout exceeded")
+                self._waiting[txn] = row
+                self._cond.wait(left)
+            self._waiting.pop(txn, None)
+            self._owners[row] = txn
+            txn.writes[row] = txn.writes.get(row, 0) + 1
+
+    def select(self, row):
+        with self._cond:
+            return self.rows[row]
+
+    def sleep(self, thread_id, seconds):
+        killed = threading.Event()
+        self._running[thread_id] = killed
+        try:
+            if killed.wait(seconds):
+                raise OperationalError(1317, "Query execution was interrupted")
+        finally:
+            self._running.pop(thread_id, None)
+
+    def kill(self, thread_id):
+        self.kills += 1
+        killed = self._running.get(thread_id)
+        if killed is not None:
+            killed.set()
+
+    def select_all(self):
+        with self._cond:
+            return sorted(self.rows.items())
+
+    def finish(self, txn, commit):
+        with self._cond:
+            if commit:
+                for row, delta in txn.writes.items():
+                    self.rows[row] += delta
+            self._release(txn)
+
+    def _release(self, txn):
+        txn.writes = {}
+        for row in [r for r, owner in self._owners.items() if owner is txn]:
+            del self._owners[row]
+        self._cond.notify_all()
+
+
+class Transaction(object):
+
+    def __init__(self):
+        self.writes = {}
+
+
+class Cursor(object):
+
+    def __init__(self, db):
+        self._db = db
+        self._rows = []
+        self.description = None
+        self.lastrowid = 0
+        self.rowcount = 0
+
+    def execute(self, query, args=None):
+        db = self._db
+        if query.startswith("DO SLEEP"):
+            db.server.sleep(db.thread_id(), args[0])
+            return 0
+        if query.startswith("KILL QUERY "):
+            db.server.kill(int(query.split()[-1]))
+            return 0
+        if query.startswith("EXPLAIN FORMAT=JSON "):
+            db.server.explains += 1
+            plan = {"query_block": {"table": {"table_name": "counters", "access_type": "ALL"}}}
+            self.description = [("EXPLAIN",)]
+            self._rows = [(json.dumps(plan),)]
+            return 1
+        if query.startswith("SELECT id"):
+            self.description = [("id",), ("n",)]
+            self._rows = db.server.select_all()
+            self.rowcount = len(self._rows)
+            return self.rowcount
+        row = args[0]
+        if query.startswith("SELECT"):
+            self.description = [("n",)]
+            self._rows = [(db.server.select(row),)]
+            self.rowcount = 1
+            return 1
+        if db.error is not None:
+            error, db.error = db.error, None
+            raise error
+        txn = db.txn or Transaction()
+        try:
+            db.server.update(txn, row)
+        except OperationalError as e:
+            if e.args[0] == 1213:
+                db.txn = None
+            raise
+        if db.txn is None:
+            db.server.finish(txn, commit=True)
+        self.rowcount = 1
+        return 1
+
+    def fetchone(self):
+        rows = self.fetchmany(1)
+        return rows[0] if rows else None
+
+    def fetchmany(self, size=1):
+        if self._db.fetch_error is not None:
+            error, self._db.fetch_error = self._db.fetch_error, None
+            raise error
+        rows, self._rows = self._rows[:size], self._rows[size:]
+        return rows
+
+    def __iter__(self):
+        rows, self._rows = self._rows, []
+        return iter(rows)
+
+    def close(self):
+        pass
+
+
+class Connection(object):
+
+    def __init__(self, server):
+        server.connections += 1
+        self.server = server
+        self.txn = None
+        self.error = None
+        self.fetch_error = None
+
+    def cursor(self):
+        return Cursor(self)
+
+    def autocommit(self, on):
+        pass
+
+    def ping(self):
+        pass
+
+    def thread_id(self):
+        return id(self)
+
+    def begin(self):
+        self.txn = Transaction()
+
+    def commit(self):
+        if self.txn is not None:
+            self.server.finish(self.txn, commit=True)
+        self.txn = None
+
+    def rollback(self):
+        if self.txn is not None:
+            self.server.finish(self.txn, commit=False)
+        self.txn = None
+
+    def close(self):
+        self.rollback()
+
+
+class FakeDriver(Driver):
+    name = "fake"
+    module_name = "fakemysql"
+
+    def __init__(self, server):
+        super(FakeDriver, self).__init__()
+        self.server = server
+
+    def _import(self):
+        module = types.SimpleNamespace(
+            Error=Error, OperationalError=OperationalError, IntegrityError=IntegrityError,
+            converters=types.SimpleNamespace(conversions={}),
+            cursors=types.SimpleNamespace(SSCursor=Cursor),
+            connect=lambda **kwargs: Connection(self.server))
+        return module
+
+    def _load(self, module):
+        pass
+
+    def connect_args(self, database, user, password):
+        return {}
+
+
+def install(server):
+    """Registers a driver named ``"fake"`` talking to ``server``."""
+    DRIVERS["fake"] = FakeDriver(server)
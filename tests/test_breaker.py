@@ -0,0 +1,124 @@
+import types
+
+import pytest
+
+import fakemysql
+from torndb import backend, breaker
+from torndb.breaker import CLOSED, HALF_OPEN, OPEN, CircuitOpenError, HostBreaker
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = types.SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(breaker, "time", types.SimpleNamespace(time=lambda: clock.now))
+    return clock
+
+
+def refuse():
+    raise fakemysql.OperationalError(2003, "Can't connect to MySQL server")
+
+
+def fail(b, connect=refuse):
+    with pytest.raises(fakemysql.Error):
+        b.connect(connect)
+
+
+def test_opens_after_threshold_and_fails_fast(clock):
+    b = HostBreaker("db:3306", failure_threshold=2, base_delay=1.0)
+    fail(b)
+    assert b.state == CLOSED
+    fail(b)
+    assert b.state == OPEN
+    assert b.opened == 1
+    calls = []
+    with pytest.raises(CircuitOpenError):
+        b.connect(lambda: calls.append(1))
+    assert calls == []
+    assert b.rejected == 1
+
+
+def test_probe_success_closes(clock):
+    b = HostBreaker("db:3306", failure_threshold=1, base_delay=1.0)
+    fail(b)
+    clock.now = b.retry_at
+
+    def probe():
+        assert b.state == HALF_OPEN
+        # Only one probe at a time.
+        with pytest.raises(CircuitOpenError):
+            b.connect(lambda: "other")
+        return "conn"
+
+    assert b.connect(probe) == "conn"
+    assert b.state == CLOSED
+    assert b.failures == 0
+    assert b.connect(lambda: "conn") == "conn"
+
+
+def test_probe_failure_reopens_with_longer_delay(clock, monkeypatch):
+    monkeypatch.setattr(breaker.random, "uniform", lambda low, high: high)
+    b = HostBreaker("db:3306", failure_threshold=1, base_delay=1.0, max_delay=30.0)
+    fail(b)
+    assert b.retry_at == clock.now + 1.0
+    clock.now = b.retry_at
+    fail(b)
+    assert b.state == OPEN
+    assert b.retry_at == clock.now + 2.0
+    assert b.opened == 2
+    with pytest.raises(CircuitOpenError):
+        b.connect(lambda: "conn")
+
+
+def test_only_unreachable_host_counts(clock):
+    b = HostBreaker("db:3306", failure_threshold=1)
+
+    def denied():
+        raise fakemysql.OperationalError(1045, "Access denied")
+
+    def unknown_database():
+        raise fakemysql.OperationalError(1049, "Unknown database")
+
+    fail(b, denied)
+    fail(b, unknown_database)
+    assert b.state == CLOSED
+    assert b.failures == 0
+
+    def timeout():
+        raise OSError("timed out")
+
+    with pytest.raises(OSError):
+        b.connect(timeout)
+    assert b.state == OPEN
+
+
+def test_login_error_on_probe_closes(clock):
+    b = HostBreaker("db:3306", failure_threshold=1)
+    fail(b)
+    clock.now = b.retry_at
+
+    def denied():
+        raise fakemysql.OperationalError(1045, "Access denied")
+
+    fail(b, denied)
+    assert b.state == CLOSED
+
+
+@pytest.fixture
+def server():
+    server = fakemysql.Server({"a": 0})
+    fakemysql.install(server)
+    yield server
+    backend.DRIVERS.pop("fake", None)
+    breaker._breakers.pop("breaker-test:3306", None)
+
+
+def test_connection_raises_driver_operational_error(server, monkeypatch):
+    conn = backend.Connection("breaker-test", "test", driver="fake")
+    monkeypatch.setattr(conn, "_connect", refuse)
+    for _ in range(breaker.get_breaker("breaker-test").failure_threshold):
+        with pytest.raises(conn.OperationalError):
+            conn.ping()
+    with pytest.raises(conn.OperationalError) as e:
+        conn.ping()
+    assert isinstance(e.value, CircuitOpenError)
+    assert e.value.args[0] == breaker.CR_CONN_HOST_ERROR
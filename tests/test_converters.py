@@ -0,0 +1,83 @@
+import datetime
+from decimal import Decimal
+
+import pytest
+
+from torndb import converters
+from torndb.converters import (
+    DATE, DATETIME, JSON, NEWDECIMAL, TIMESTAMP, LazyJSON, build_conversions, epoch_datetime,
+    fast_date, fast_datetime, fast_decimal, iso_datetime)
+
+
+def test_fast_datetime():
+    assert fast_datetime(b"2024-05-01 12:34:56") == datetime.datetime(2024, 5, 1, 12, 34, 56)
+    assert fast_datetime("2024-05-01 12:34:56") == datetime.datetime(2024, 5, 1, 12, 34, 56)
+
+
+@pytest.mark.parametrize("raw, micro", [
+    (b"2024-05-01 12:34:56.5", 500000),
+    (b"2024-05-01 12:34:56.000123", 123),
+    (b"2024-05-01 12:34:56.123456", 123456),
+])
+def test_fast_datetime_fractional_seconds(raw, micro):
+    assert fast_datetime(raw) == datetime.datetime(2024, 5, 1, 12, 34, 56, micro)
+
+
+def test_fast_datetime_date_only():
+    assert fast_datetime(b"2024-05-01") == datetime.date(2024, 5, 1)
+
+
+@pytest.mark.parametrize("func, raw", [
+    (fast_datetime, b"0000-00-00 00:00:00"),
+    (fast_datetime, b"2024-00-00 00:00:00"),
+    (fast_date, b"0000-00-00"),
+    (epoch_datetime, b"0000-00-00 00:00:00"),
+])
+def test_zero_dates_are_none(func, raw):
+    assert func(raw) is None
+
+
+def test_fast_date_and_decimal():
+    assert fast_date(b"2024-02-29") == datetime.date(2024, 2, 29)
+    assert fast_decimal(b"12.50") == Decimal("12.50")
+    assert str(fast_decimal(b"-0.001")) == "-0.001"
+
+
+def test_iso_and_epoch():
+    assert iso_datetime(b"2024-05-01 12:34:56.5") == "2024-05-01T12:34:56.5"
+    assert epoch_datetime(b"1970-01-02 00:00:01") == 86401
+    assert epoch_datetime(b"1970-01-02 00:00:01.999") == 86401
+
+
+def test_lazy_json_decodes_on_first_read(monkeypatch):
+    calls = []
+    loads = converters.json.loads
+    monkeypatch.setattr(converters.json, "loads", lambda raw: calls.append(raw) or loads(raw))
+    value = LazyJSON(b'{"id": 1, "tags": ["a"]}')
+    assert calls == []
+    assert str(value) == '{"id": 1, "tags": ["a"]}'
+    assert value.value == {"id": 1, "tags": ["a"]}
+    assert value.value["tags"] == ["a"]
+    assert len(calls) == 1
+    assert value == {"id": 1, "tags": ["a"]}
+    assert value == LazyJSON('{"tags": ["a"], "id": 1}')
+    with pytest.raises(TypeError):
+        hash(value)
+
+
+def test_build_conversions():
+    base = {DATETIME: str, DATE: str, 1: int}
+    conv = build_conversions(base, "fast")
+    assert conv[DATETIME] is fast_datetime
+    assert conv[TIMESTAMP] is fast_datetime
+    assert conv[NEWDECIMAL] is fast_decimal
+    assert conv[1] is int
+    assert base[DATETIME] is str
+    assert build_conversions(base) == base
+
+    combined = build_conversions(base, ["iso", "lazy_json", {1: float}])
+    assert combined[DATETIME] is iso_datetime
+    assert combined[JSON] is LazyJSON
+    assert combined[1] is float
+    with pytest.raises(ValueError):
+        build_conversions(base, "nope")
@@ -0,0 +1,73 @@
+import threading
+import time
+
+import pytest
+
+import fakemysql
+from torndb import backend, mysqldb
+from torndb.deadline import QueryTimeoutError
+
+UPDATE = "UPDATE counters SET n = n + 1 WHERE id = %s"
+SELECT = "SELECT n FROM counters WHERE id = %s"
+
+
+@pytest.fixture
+def server():
+    server = fakemysql.Server({"a": 0})
+    fakemysql.install(server)
+    yield server
+    backend.DRIVERS.pop("fake", None)
+
+
+@pytest.fixture(params=[mysqldb.Connection, backend.Connection])
+def conn(request, server):
+    conn = request.param("localhost", "test", driver="fake", query_timeout=30)
+    conn.ping()
+    yield conn
+    conn.close()
+
+
+def test_statements_share_one_watchdog_thread(conn, server, monkeypatch):
+    conn.execute(UPDATE, "a")
+    started = []
+    start = threading.Thread.start
+    monkeypatch.setattr(threading.Thread, "start",
+                        lambda thread: started.append(thread) or start(thread))
+    for _ in range(200):
+        conn.execute(UPDATE, "a")
+    assert started == []
+    assert server.rows["a"] == 201
+    assert server.kills == 0
+
+
+def test_overrunning_statement_is_killed(conn, server):
+    start = time.time()
+    with pytest.raises(QueryTimeoutError):
+        with conn.deadline(0.05):
+            conn.execute("DO SLEEP(%s)", 5)
+    assert time.time() - start < 2
+    assert server.kills == 1
+    assert conn.get(SELECT, "a")["n"] == 0
+
+
+def test_timeout_while_fetching_is_a_query_timeout(conn):
+    conn._db.fetch_error = fakemysql.OperationalError(
+        3024, "Query execution was interrupted, maximum statement execution time exceeded")
+    with pytest.raises(QueryTimeoutError):
+        conn.get(SELECT, "a")
+    assert conn.get(SELECT, "a")["n"] == 0
+
+
+def test_observed_time_includes_fetching(conn, monkeypatch):
+    elapsed = []
+
+    class Recorder(object):
+        def record(self, conn_id, query, args, start, seconds):
+            elapsed.append(seconds)
+
+    fetchmany = fakemysql.Cursor.fetchmany
+    monkeypatch.setattr(fakemysql.Cursor, "fetchmany",
+                        lambda cursor, size=1: time.sleep(0.05) or fetchmany(cursor, size))
+    conn.recorder = Recorder()
+    conn.get(SELECT, "a")
+    assert elapsed[0] >= 0.05
@@ -0,0 +1,59 @@
+import pytest
+
+import fakemysql
+from torndb import backend, mysqldb
+from torndb.guards import MultipleRowsError, ResultTooLargeError
+
+UPDATE = "UPDATE counters SET n = n + 1 WHERE id = %s"
+SELECT = "SELECT n FROM counters WHERE id = %s"
+SELECT_ALL = "SELECT id, n FROM counters"
+
+
+@pytest.fixture
+def server():
+    server = fakemysql.Server(("row%04d" % i, 0) for i in range(1000))
+    fakemysql.install(server)
+    yield server
+    backend.DRIVERS.pop("fake", None)
+
+
+@pytest.fixture(params=[mysqldb.Connection, backend.Connection])
+def conn(request, server):
+    conn = request.param("localhost", "test", driver="fake")
+    conn.ping()
+    yield conn
+    conn.close()
+
+
+def test_query_stops_at_limit(conn):
+    with pytest.raises(ResultTooLargeError):
+        conn.query(SELECT_ALL, max_rows=10)
+    assert len(conn.query(SELECT_ALL, max_rows=1000)) == 1000
+
+
+def test_get_stops_at_second_row(conn):
+    with pytest.raises(MultipleRowsError):
+        conn.get(SELECT_ALL)
+    assert conn.get(SELECT, "row0001")["n"] == 0
+
+
+def test_limit_in_transaction_is_not_hidden(conn):
+    with pytest.raises(ResultTooLargeError):
+        with conn.transaction():
+            conn.execute(UPDATE, "row0001")
+            conn.query(SELECT_ALL, max_rows=10)
+    assert conn.get(SELECT, "row0001")["n"] == 0
+
+
+def test_transaction_lost_to_limit_does_not_reconnect(conn, server):
+    with pytest.raises(conn.OperationalError):
+        with conn.transaction():
+            conn.execute(UPDATE, "row0001")
+            try:
+                conn.query(SELECT_ALL, max_rows=10)
+            except ResultTooLargeError:
+                pass
+            conn.execute(UPDATE, "row0002")
+    assert server.rows["row0001"] == server.rows["row0002"] == 0
+    conn.execute(UPDATE, "row0002")
+    assert server.rows["row0002"] == 1
@@ -0,0 +1,47 @@
+import pytest
+
+from torndb import backend
+from torndb.loader import Loader
+
+
+class Recording(backend.Connection):
+
+    def __init__(self):
+        self.calls = []
+
+    def query(self, query, *params):
+        self.calls.append((query, params))
+        return [{"id": key, "name": "user %d" % key} for key in params if key < 100]
+
+
+def test_coalesces_lookups():
+    conn = Recording()
+    loader = Loader(conn, "users")
+    first, second, missing = loader.load(1), loader.load(2), loader.load(500)
+    assert first.get()["name"] == "user 1"
+    assert second.get()["name"] == "user 2"
+    assert missing.get() is None
+    assert conn.calls == [("SELECT * FROM `users` WHERE `id` IN (%s, %s, %s)", (1, 2, 500))]
+
+
+def test_rejects_unknown_connections():
+    with pytest.raises(TypeError):
+        Loader(object(), "users")
+
+
+def test_failed_batch_stays_pending():
+    class Flaky(Recording):
+        def query(self, query, *params):
+            if not self.calls:
+                self.calls.append(None)
+                raise RuntimeError("server gone")
+            return super(Flaky, self).query(query, *params)
+
+    conn = Flaky()
+    loader = Loader(conn, "users")
+    first, second = loader.load(1), loader.load(2)
+    with pytest.raises(RuntimeError):
+        first.get()
+    assert first.get()["name"] == "user 1"
+    assert second.get()["name"] == "user 2"
+    assert len(conn.calls) == 2
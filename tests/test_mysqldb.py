@@ -0,0 +1,26 @@
+import pytest
+
+import fakemysql
+from torndb import backend, mysqldb
+
+
+@pytest.fixture
+def server():
+    server = fakemysql.Server({"a": 0})
+    fakemysql.install(server)
+    yield server
+    backend.DRIVERS.pop("fake", None)
+
+
+def test_positional_arguments(server):
+    conn = mysqldb.Connection("localhost", "test", None, None, 3600, 5, "+8:00", "utf8mb4",
+                              "ANSI", driver="fake")
+    try:
+        assert conn.max_idle_time == 3600
+        assert conn._db_args["connect_timeout"] == 5
+        assert conn._db_args["init_command"] == 'SET time_zone = "+8:00"'
+        assert conn._db_args["charset"] == "utf8mb4"
+        assert conn._db_args["sql_mode"] == "ANSI"
+        assert conn._db is not None
+    finally:
+        conn.close()
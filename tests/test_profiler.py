@@ -0,0 +1,61 @@
+import pytest
+
+import fakemysql
+from torndb import backend, mysqldb
+from torndb.profiler import ExplainProfiler
+
+UPDATE = "UPDATE counters SET n = n + 1 WHERE id = %s"
+SELECT = "SELECT n FROM counters WHERE id = %s"
+
+
+@pytest.fixture
+def server():
+    server = fakemysql.Server({"a": 0})
+    fakemysql.install(server)
+    yield server
+    backend.DRIVERS.pop("fake", None)
+
+
+@pytest.fixture(params=[mysqldb.Connection, backend.Connection])
+def conn(request, server):
+    conn = request.param("localhost", "test", driver="fake")
+    conn.ping()
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def profiler():
+    profiler = ExplainProfiler(threshold=0, sample_rate=1.0)
+    yield profiler
+    profiler.close()
+
+
+def test_explains_on_one_side_connection(conn, server, profiler):
+    conn.profiler = profiler
+    for _ in range(5):
+        conn.get(SELECT, "a")
+    profiler.flush()
+
+    [entry] = profiler.report()
+    assert entry["explained"] == 5
+    assert entry["flags"] == ["full_scan"]
+    assert server.connections == 2
+
+
+def test_failed_statements_are_not_observed(conn, server, profiler):
+    conn.profiler = profiler
+    conn._db.error = fakemysql.IntegrityError(1062, "Duplicate entry")
+    with pytest.raises(fakemysql.IntegrityError):
+        conn.execute(UPDATE, "a")
+    profiler.flush()
+    assert profiler.report() == []
+
+
+def test_observer_errors_do_not_fail_statements(conn, server):
+    class Broken(object):
+        def record(self, *args):
+            raise RuntimeError("disk full")
+
+    conn.recorder = Broken()
+    assert conn.get(SELECT, "a")["n"] == 0
@@ -0,0 +1,69 @@
+import pytest
+
+from torndb.guards import ResultTooLargeError
+from torndb.records import Record, RecordCollection
+
+
+class Source(object):
+
+    def __init__(self, n):
+        self._rows = iter([Record(["id", "name"], [i, "row%d" % i]) for i in range(n)])
+        self.closed = False
+        self.aborted = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._rows)
+
+    def close(self):
+        self.closed = True
+
+    def abort(self):
+        self.aborted = True
+
+
+@pytest.mark.parametrize("cache", [True, False])
+def test_first(cache):
+    rows = RecordCollection(Source(3), cache=cache)
+    assert rows.first(as_ordereddict=True) == {"id": 0, "name": "row0"}
+    assert RecordCollection(Source(0), cache=cache).first("none") == "none"
+    with pytest.raises(LookupError):
+        RecordCollection(Source(0), cache=cache).first(LookupError)
+
+
+def test_uncached_first_reads_next_row_and_closes():
+    source = Source(3)
+    rows = RecordCollection(source, cache=False)
+    assert rows.first(as_dict=True) == {"id": 0, "name": "row0"}
+    assert source.closed
+    assert not rows.pending
+    with pytest.raises(TypeError):
+        rows[0]
+
+
+@pytest.mark.parametrize("cache", [True, False])
+def test_one(cache):
+    source = Source(1)
+    assert RecordCollection(source, cache=cache).one().name == "row0"
+    assert source.closed is not cache
+    assert RecordCollection(Source(0), cache=cache).one() is None
+    source = Source(2)
+    with pytest.raises(ValueError):
+        RecordCollection(source, cache=cache).one()
+    assert source.closed is not cache
+
+
+@pytest.mark.parametrize("cache", [True, False])
+def test_scalar(cache):
+    assert RecordCollection(Source(1), cache=cache).scalar() == 0
+    assert RecordCollection(Source(0), cache=cache).scalar("none") == "none"
+
+
+def test_limit_aborts_source():
+    source = Source(5)
+    rows = RecordCollection(source, cache=False, max_rows=2)
+    with pytest.raises(ResultTooLargeError):
+        rows.all()
+    assert source.aborted
@@ -0,0 +1,137 @@
+import threading
+
+import pytest
+
+import fakemysql
+from torndb import backend, mysqldb
+from torndb.retry import RetryPolicy
+
+UPDATE = "UPDATE counters SET n = n + 1 WHERE id = %s"
+SELECT = "SELECT n FROM counters WHERE id = %s"
+
+
+@pytest.fixture
+def server():
+    server = fakemysql.Server({"a": 0, "b": 0})
+    fakemysql.install(server)
+    yield server
+    backend.DRIVERS.pop("fake", None)
+
+
+@pytest.fixture(params=[mysqldb.Connection, backend.Connection])
+def connect(request, server):
+    conns = []
+
+    def connect():
+        conn = request.param("localhost", "test", driver="fake")
+        conns.append(conn)
+        return conn
+
+    yield connect
+    for conn in conns:
+        conn.close()
+
+
+def policy():
+    return RetryPolicy(max_retries=50, base_delay=0.001, max_delay=0.01)
+
+
+def run_threads(targets):
+    errors = []
+
+    def run(target):
+        try:
+            target()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(t,)) for t in targets]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    assert not errors
+
+
+def test_deadlock_is_retried(server, connect):
+    retry = policy()
+    barrier = threading.Barrier(2, timeout=5)
+
+    def worker(first, second, n):
+        conn = connect()
+        for i in range(n):
+            attempts = []
+
+            def transfer(c):
+                c.execute(UPDATE, first)
+                if i == 0 and not attempts:
+                    # Both threads hold their first lock before asking for
+                    # the other one: a guaranteed deadlock.
+                    attempts.append(1)
+                    barrier.wait()
+                c.execute(UPDATE, second)
+
+            conn.run_transaction(transfer, retry)
+
+    run_threads([lambda: worker("a", "b", 20), lambda: worker("b", "a", 20)])
+
+    assert server.rows == {"a": 40, "b": 40}
+    assert retry.stats.deadlocks >= 1
+    assert retry.stats.transactions == 40
+    assert retry.stats.exhausted == 0
+
+
+def test_lock_wait_timeout_is_retried(server, connect):
+    server.lock_wait_timeout = 0.01
+    retry = policy()
+    holding = threading.Event()
+
+    def holder():
+        conn = connect()
+        with conn.transaction():
+            conn.execute(UPDATE, "a")
+            holding.set()
+            threading.Event().wait(0.1)
+
+    def waiter():
+        conn = connect()
+        holding.wait(5)
+        conn.run_transaction(lambda c: c.execute(UPDATE, "a"), retry)
+
+    run_threads([holder, waiter])
+
+    assert server.rows["a"] == 2
+    assert retry.stats.lock_wait_timeouts >= 1
+    assert retry.stats.exhausted == 0
+
+
+def test_deadlock_keeps_connection(server, connect):
+    conn = connect()
+    conn.ping()
+    conn._db.error = fakemysql.OperationalError(1213, "Deadlock found")
+    retry = policy()
+    conn.run_transaction(lambda c: c.execute(UPDATE, "a"), retry)
+    assert retry.stats.deadlocks == 1
+    assert conn.get(SELECT, "a")["n"] == 1
+
+
+def test_other_errors_are_not_retried(server, connect):
+    conn = connect()
+    conn.ping()
+    conn._db.error = fakemysql.IntegrityError(1062, "Duplicate entry")
+    retry = policy()
+    with pytest.raises(fakemysql.IntegrityError):
+        conn.run_transaction(lambda c: c.execute(UPDATE, "a"), retry)
+    assert retry.stats.retries == 0
+    assert server.rows["a"] == 0
+
+
+def test_lost_connection_is_not_hidden(server, connect):
+    conn = connect()
+    conn.ping()
+    conn._db.error = fakemysql.OperationalError(2013, "Lost connection to MySQL server")
+    with pytest.raises(fakemysql.OperationalError):
+        conn.run_transaction(lambda c: c.execute(UPDATE, "a"), policy())
+    assert conn._db is None
+    assert conn.get(SELECT, "a")["n"] == 0
+
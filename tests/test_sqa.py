@@ -0,0 +1,84 @@
+import pytest
+
+pytest.importorskip("sqlalchemy")
+
+from sqlalchemy.pool import QueuePool  # noqa: E402
+
+from torndb import sqa  # noqa: E402
+from torndb.guards import ResultTooLargeError  # noqa: E402
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = sqa.Database("sqlite:///" + str(tmp_path / "test.db"), poolclass=QueuePool,
+                      connect_args={"check_same_thread": False})
+    with db.get_connection() as conn:
+        conn.query("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)")
+        for i in range(5):
+            conn.query("INSERT INTO items (id, name) VALUES (:id, :name)",
+                       id=i, name="item%d" % i)
+    yield db
+    db.close()
+
+
+def test_query_without_rows_does_not_read_keys(db, monkeypatch):
+    class NoRows(object):
+        returns_rows = False
+
+        def keys(self):
+            raise AssertionError("keys() of a result without rows")
+
+    with db.get_connection() as conn:
+        monkeypatch.setattr(conn, "execute", lambda *args, **kwargs: NoRows())
+        assert conn.query("DELETE FROM items").all() == []
+
+
+def test_query(db):
+    with db.get_connection() as conn:
+        rows = conn.query("SELECT id, name FROM items WHERE id < :id ORDER BY id", id=2)
+        assert [r.as_dict() for r in rows] == [
+            {"id": 0, "name": "item0"}, {"id": 1, "name": "item1"}]
+
+
+def checked_out(db):
+    return db._engine.pool.checkedout()
+
+
+def test_stream_releases_connection_when_exhausted(db):
+    rows = db.stream("SELECT id FROM items ORDER BY id", yield_per=2)
+    assert checked_out(db) == 1
+    assert [r.id for r in rows] == [0, 1, 2, 3, 4]
+    assert checked_out(db) == 0
+
+
+def test_stream_releases_connection_on_close(db):
+    rows = db.stream("SELECT id FROM items ORDER BY id", yield_per=2)
+    assert next(iter(rows)).id == 0
+    rows.close()
+    assert checked_out(db) == 0
+
+
+def test_stream_releases_connection_on_abort(db, monkeypatch):
+    invalidated = []
+    conn = db.get_connection()
+    invalidate = conn._conn.invalidate
+    monkeypatch.setattr(conn._conn, "invalidate", lambda: invalidated.append(1) or invalidate())
+    rows = conn.stream("SELECT id FROM items", yield_per=2, max_rows=2, close_connection=True)
+    with pytest.raises(ResultTooLargeError):
+        rows.all()
+    assert invalidated == [1]
+    assert not conn.open
+    assert checked_out(db) == 0
+
+
+@pytest.mark.parametrize("method", ["first", "one", "scalar"])
+def test_stream_single_row_helpers(db, method):
+    rows = db.stream("SELECT id FROM items WHERE id = :id", id=3)
+    result = getattr(rows, method)()
+    assert (result if method == "scalar" else result.id) == 3
+    assert checked_out(db) == 0
+
+
+def test_query_releases_connection(db):
+    assert [r.id for r in db.query("SELECT id FROM items ORDER BY id")] == [0, 1, 2, 3, 4]
+    assert checked_out(db) == 0
@@ -0,0 +1,69 @@
+import pytest
+
+from torndb.upsert import UpsertStatement, chunked, quote_identifier, upsert, upsert_counts
+
+
+def test_quote_identifier():
+    assert quote_identifier("blog.entries") == "`blog`.`entries`"
+    with pytest.raises(ValueError):
+        quote_identifier("entries; DROP TABLE x")
+
+
+def test_chunked():
+    assert list(chunked(range(5), 2)) == [[0, 1], [2, 3], [4]]
+    assert list(chunked([], 2)) == []
+    with pytest.raises(ValueError):
+        list(chunked([1], 0))
+
+
+def test_statement_sql():
+    stmt = UpsertStatement("counters", ["id", "n", "label"], "id")
+    assert stmt.sql(2) == (
+        "INSERT INTO `counters` (`id`, `n`, `label`) VALUES (%s, %s, %s), (%s, %s, %s)"
+        " ON DUPLICATE KEY UPDATE `n` = VALUES(`n`), `label` = VALUES(`label`)")
+    assert stmt.sql(2) is stmt.sql(2)
+
+
+def test_statement_without_update_columns_ignores_duplicates():
+    stmt = UpsertStatement("tags", ["id"], ["id"])
+    assert stmt.sql(1).endswith(" ON DUPLICATE KEY UPDATE `id` = `id`")
+
+
+def test_statement_rejects_unknown_columns():
+    with pytest.raises(ValueError):
+        UpsertStatement("counters", ["id", "n"], "key")
+    with pytest.raises(ValueError):
+        UpsertStatement("counters", ["id", "n"], "id", update=["other"])
+
+
+def test_params_follow_column_order():
+    stmt = UpsertStatement("counters", ["id", "n"], "id")
+    assert stmt.params([{"n": 5, "id": 1}, {"id": 2, "n": 6}]) == [1, 5, 2, 6]
+    assert UpsertStatement("tags", ["id"], "id").params([{"id": 1}, {"id": 2}]) == [1, 2]
+
+
+@pytest.mark.parametrize("row", [{"id": 2}, {"id": 2, "m": 6}, {"id": 2, "n": 6, "m": 7}])
+def test_params_reject_other_columns(row):
+    stmt = UpsertStatement("counters", ["id", "n"], "id")
+    with pytest.raises(ValueError):
+        stmt.params([{"id": 1, "n": 5}, row])
+
+
+def test_upsert_counts():
+    assert upsert_counts(3, 3) == {"rows": 3, "affected": 3, "inserted": 3, "updated": 0}
+    assert upsert_counts(3, 5) == {"rows": 3, "affected": 5, "inserted": 1, "updated": 2}
+    assert upsert_counts(2, 4) == {"rows": 2, "affected": 4, "inserted": 0, "updated": 2}
+
+
+def test_upsert_runs_one_statement_per_chunk():
+    calls = []
+
+    def execute_rowcount(sql, params):
+        calls.append((sql.count("(%s, %s)"), params))
+        return len(params) // 2
+
+    rows = [{"id": i, "n": i * 10} for i in range(5)]
+    counts = upsert(execute_rowcount, "counters", "id", rows, chunk_size=2)
+    assert calls == [(2, [0, 0, 1, 10]), (2, [2, 20, 3, 30]), (1, [4, 40])]
+    assert [c["rows"] for c in counts] == [2, 2, 1]
+    assert sum(c["inserted"] for c in counts) == 5
@@ -0,0 +1,95 @@
+import pytest
+
+import fakemysql
+from torndb import backend, workload
+from torndb.workload import WorkloadRecorder, to_pyformat
+
+UPDATE = "UPDATE counters SET n = n + 1 WHERE id = %s"
+
+
+class Recording(object):
+
+    def __init__(self):
+        self.calls = []
+
+    def query(self, query, *args, **kwargs):
+        self.calls.append(("query", query, args, kwargs))
+        return []
+
+    def execute(self, query, *args, **kwargs):
+        self.calls.append(("execute", query, args, kwargs))
+
+    def close(self):
+        pass
+
+
+@pytest.mark.parametrize("params, logged", [
+    (5, [5]),
+    ("abc", ["abc"]),
+    (0, [0]),
+    (None, None),
+    ((), None),
+    ((1, "x"), [1, "x"]),
+    ([b"\x00\xff"], [b"\x00\xff"]),
+    ({"id": 1}, {"id": 1}),
+    (({"id": 1},), {"id": 1}),
+])
+def test_record_normalizes_params(tmp_path, params, logged):
+    path = str(tmp_path / "capture.log")
+    with WorkloadRecorder(path) as recorder:
+        recorder.record("conn", "SELECT %s", params, recorder.started, 0.001)
+    [(offset, elapsed, cid, query, loaded)] = workload.load(path)
+    assert (cid, query, loaded) == (0, "SELECT %s", logged)
+
+
+@pytest.mark.parametrize("params, args", [
+    (5, (5,)),
+    ("abc", ("abc",)),
+    (0, (0,)),
+    (None, ()),
+    ([1, 2], (1, 2)),
+])
+def test_execute_spreads_positional_params(params, args):
+    conn = Recording()
+    workload.execute(conn, "UPDATE t SET a = %s", params)
+    assert conn.calls == [("execute", "UPDATE t SET a = %s", args, {})]
+
+
+def test_execute_converts_named_binds():
+    conn = Recording()
+    workload.execute(conn, "SELECT * FROM t WHERE id = :id AND name LIKE 'a%'", {"id": 3})
+    assert conn.calls == [
+        ("query", "SELECT * FROM t WHERE id = %(id)s AND name LIKE 'a%%'", (), {"id": 3})]
+
+
+def test_to_pyformat():
+    assert to_pyformat("SELECT :a, :b", {"a": 1, "b": 2}) == "SELECT %(a)s, %(b)s"
+    assert to_pyformat("SELECT '12:30:00', :a", {"a": 1}) == "SELECT '12:30:00', %(a)s"
+    assert to_pyformat("SELECT a::text, :a", {"a": 1}) == "SELECT a::text, %(a)s"
+    assert to_pyformat("SELECT %(a)s", {"a": 1}) == "SELECT %(a)s"
+    assert to_pyformat("SELECT :other", {"a": 1}) == "SELECT :other"
+
+
+def test_capture_and_replay(tmp_path):
+    captured = fakemysql.Server({"a": 0, "b": 0})
+    fakemysql.install(captured)
+    path = str(tmp_path / "capture.log")
+    try:
+        with WorkloadRecorder(path) as recorder:
+            conn = backend.Connection("localhost", "test", driver="fake")
+            conn.recorder = recorder
+            conn.execute(UPDATE, "a")
+            conn.execute(UPDATE, "b")
+            conn.execute(UPDATE, "a")
+            conn.close()
+
+        replayed = fakemysql.Server({"a": 0, "b": 0})
+        fakemysql.install(replayed)
+        report = workload.replay(
+            path, lambda: backend.Connection("localhost", "test", driver="fake"),
+            concurrency=2, speed=None)
+    finally:
+        backend.DRIVERS.pop("fake", None)
+    assert report["statements"] == 3
+    assert report["errors"] == 0
+    assert replayed.rows == captured.rows == {"a": 2, "b": 1}
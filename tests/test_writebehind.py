@@ -0,0 +1,76 @@
+import threading
+import time
+
+import pytest
+
+from torndb.writebehind import WriteBehindBuffer
+
+
+class Recording(object):
+
+    def __init__(self):
+        self.batches = []
+        self.entered = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+
+    def executemany_rowcount(self, query, params):
+        self.entered.set()
+        self.release.wait()
+        self.batches.append(list(params))
+        return len(params)
+
+
+def rows(n):
+    return [{"id": i, "name": "row%d" % i} for i in range(n)]
+
+
+def test_batches_by_size_and_flushes_rest_on_close():
+    db = Recording()
+    buf = WriteBehindBuffer(db, "events", ["id", "name"], batch_size=3, flush_interval=60)
+    for row in rows(7):
+        assert buf.put(row)
+    deadline = time.time() + 2
+    while buf.stats.written < 6 and time.time() < deadline:
+        time.sleep(0.01)
+    buf.close()
+    assert [len(b) for b in db.batches] == [3, 3, 1]
+    assert db.batches[0][0] == (0, "row0")
+    assert buf.stats.written == 7
+    assert buf.stats.flushes == 3
+    with pytest.raises(RuntimeError):
+        buf.put(rows(1)[0])
+
+
+def test_flushes_after_interval():
+    db = Recording()
+    buf = WriteBehindBuffer(db, "events", ["id", "name"], batch_size=100, flush_interval=0.05)
+    try:
+        buf.put(rows(1)[0])
+        assert db.entered.wait(2)
+        assert buf.stats.accepted == 1
+    finally:
+        buf.close()
+    assert db.batches == [[(0, "row0")]]
+
+
+def test_drops_when_full_and_close_honours_timeout():
+    db = Recording()
+    db.release.clear()
+    buf = WriteBehindBuffer(db, "events", ["id", "name"], batch_size=1, max_pending=2)
+    first, second, third, fourth = rows(4)
+    assert buf.put(first)
+    assert db.entered.wait(2)
+    assert buf.put(second)
+    assert buf.put(third)
+    assert not buf.put(fourth)
+    assert buf.stats.dropped == 1
+
+    start = time.time()
+    buf.close(timeout=0.1)
+    assert time.time() - start < 1
+    db.release.set()
+    buf._thread.join(2)
+    assert not buf._thread.is_alive()
+    assert [b[0][0] for b in db.batches] == [0, 1, 2]
+    assert buf.stats.written == 3
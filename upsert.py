@@ -0,0 +1,128 @@
+import re
+from itertools import islice
+from operator import itemgetter
+
+_IDENTIFIER_RE = re.compile(r"^[A-Za-z0-9_$]+$")
+
+
+def quote_identifier(name):
+    """Quotes a table or column name, allowing ``db.table`` style names."""
+    parts = name.split(".")
+    for part in parts:
+        if not _IDENTIFIER_RE.match(part):
+            raise ValueError("Invalid identifier: {!r}".format(name))
+    return ".".join("`%s`" % part for part in parts)
+
+
+def chunked(rows, size):
+    """Yields lists of at most ``size`` items from the ``rows`` iterable."""
+    if size <= 0:
+        raise ValueError("chunk_size must be positive")
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class UpsertStatement(object):
+    """A multi-row ``INSERT ... ON DUPLICATE KEY UPDATE`` for a fixed
+    column list. Identifiers are validated once when the statement is
+    built; rows are only checked for having exactly those columns.
+    """
+
+    def __init__(self, table, columns, keys, update=None):
+        if isinstance(keys, str):
+            keys = [keys]
+        self.columns = list(columns)
+        self.keys = list(keys)
+        if not self.columns:
+            raise ValueError("Rows must have at least one column")
+        if not self.keys:
+            raise ValueError("At least one key column is required")
+        missing = set(self.keys).difference(self.columns)
+        if missing:
+            raise ValueError("Key columns not in rows: {}".format(", ".join(sorted(missing))))
+        if update is None:
+            update = [c for c in self.columns if c not in self.keys]
+        elif isinstance(update, str):
+            update = [update]
+        self.update = list(update)
+        unknown = set(self.update).difference(self.columns)
+        if unknown:
+            raise ValueError("Update columns not in rows: {}".format(", ".join(sorted(unknown))))
+
+        quoted = [quote_identifier(c) for c in self.columns]
+        if self.update:
+            assignments = ", ".join(
+                "{0} = VALUES({0})".format(quote_identifier(c)) for c in self.update)
+        else:
+            # Nothing to update, but the clause still needs an assignment
+            # so that duplicates are ignored instead of raising.
+            key = quote_identifier(self.keys[0])
+            assignments = "{0} = {0}".format(key)
+        self._prefix = "INSERT INTO {} ({}) VALUES ".format(
+            quote_identifier(table), ", ".join(quoted))
+        self._suffix = " ON DUPLICATE KEY UPDATE " + assignments
+        self._placeholder = "(" + ", ".join(["%s"] * len(self.columns)) + ")"
+        self._getter = itemgetter(*self.columns)
+        self._sql_cache = {}
+
+    def sql(self, nrows):
+        """Returns the statement text for ``nrows`` rows."""
+        sql = self._sql_cache.get(nrows)
+        if sql is None:
+            sql = self._prefix + ", ".join([self._placeholder] * nrows) + self._suffix
+            self._sql_cache[nrows] = sql
+        return sql
+
+    def params(self, rows):
+        """Flattens ``rows`` into a single parameter list."""
+        ncols = len(self.columns)
+        getter = self._getter
+        params = []
+        for row in rows:
+            # Same length and every column found means the same key set.
+            if len(row) != ncols:
+                raise ValueError("Row columns do not match the first row: {!r}".format(sorted(row)))
+            try:
+                values = getter(row)
+            except KeyError:
+                raise ValueError(
+                    "Row columns do not match the first row: {!r}".format(sorted(row))) from None
+            if ncols == 1:
+                params.append(values)
+            else:
+                params.extend(values)
+        return params
+
+
+def upsert_counts(nrows, rowcount):
+    """Splits the affected row count of an upsert into inserted/updated.
+
+    MySQL counts 1 per inserted row and 2 per updated row, but also 0 per
+    row left unchanged (1 with ``CLIENT.FOUND_ROWS``), so the split is
+    only exact when no row is left unchanged: otherwise updates are
+    under-counted and reported as inserts. ``affected`` is the raw count.
+    """
+    updated = min(max(rowcount - nrows, 0), nrows)
+    return {"rows": nrows, "affected": rowcount, "inserted": nrows - updated, "updated": updated}
+
+
+def upsert(execute_rowcount, table, keys, rows, update=None, chunk_size=500):
+    """Runs chunked upserts of dict ``rows`` into ``table``.
+
+    ``execute_rowcount`` is called with ``(sql, params)`` for every chunk
+    and must return the affected row count. Returns a list with one
+    ``{"rows", "affected", "inserted", "updated"}`` dict per chunk; see
+    `upsert_counts` for when the split is exact.
+    """
+    stmt = None
+    counts = []
+    for chunk in chunked(rows, chunk_size):
+        if stmt is None:
+            stmt = UpsertStatement(table, chunk[0].keys(), keys, update)
+        rowcount = execute_rowcount(stmt.sql(len(chunk)), stmt.params(chunk))
+        counts.append(upsert_counts(len(chunk), rowcount))
+    return counts
@@ -0,0 +1,284 @@
+"""Workload capture and replay.
+
+Attach a `WorkloadRecorder` to connections to log every statement, then
+re-run the log against another server::
+
+    python -m torndb.workload replay capture.log --host localhost \\
+        --database blog --user blog --password blog --concurrency 16 --speed 2
+"""
+import argparse
+import base64
+import datetime
+import json
+import math
+import re
+import threading
+import time
+
+_BYTES = "$b"
+# SQLAlchemy's ``text()`` bind parameter syntax.
+_NAMED_BIND_RE = re.compile(r"(?<![:\w\\]):(\w+)(?!:)")
+
+
+def _encode(value):
+    if isinstance(value, (bytes, bytearray)):
+        return {_BYTES: base64.b64encode(value).decode("ascii")}
+    if isinstance(value, datetime.datetime):
+        return value.isoformat(" ")
+    # Dates, times, Decimals and anything else the driver can quote.
+    return str(value)
+
+
+def _decode(obj):
+    if len(obj) == 1 and _BYTES in obj:
+        return base64.b64decode(obj[_BYTES])
+    return obj
+
+
+def _normalize_params(params):
+    # Drivers take one value, a sequence or a dict; SQLAlchemy passes a
+    # dict as the single item of its positional parameters.
+    if params is None:
+        return []
+    if isinstance(params, dict):
+        return params
+    if isinstance(params, (list, tuple)):
+        if len(params) == 1 and isinstance(params[0], dict):
+            return params[0]
+        return list(params)
+    return [params]
+
+
+def to_pyformat(query, params):
+    """Rewrites the SQLAlchemy ``:name`` binds of ``query`` that name a key
+    of ``params`` to the DB-API ``%(name)s`` style, escaping any other
+    ``%``. Queries without such binds are returned unchanged.
+    """
+    parts = []
+    pos = 0
+    for match in _NAMED_BIND_RE.finditer(query):
+        if match.group(1) in params:
+            parts.append(query[pos:match.start()].replace("%", "%%"))
+            parts.append("%%(%s)s" % match.group(1))
+            pos = match.end()
+    if not parts:
+        return query
+    parts.append(query[pos:].replace("%", "%%"))
+    return "".join(parts)
+
+
+class WorkloadRecorder(object):
+    """Appends statements to a compact JSON-lines log.
+
+    Every distinct query text is written once with an id; each execution
+    is then a short ``[offset, elapsed, connection, id, params]`` line.
+    Concurrency is recovered from the overlapping offsets at replay time.
+    Attach one recorder to any number of connections by setting their
+    ``recorder`` attribute; it is thread-safe.
+    """
+
+    def __init__(self, path, buffer_size=1 << 16):
+        self.path = path
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._queries = {}
+        self._connections = {}
+        self._file = open(path, "w", buffering=buffer_size)
+        self._file.write(json.dumps({"version": 1, "started": self.started}) + "\n")
+
+    def __repr__(self):
+        return "<WorkloadRecorder {} queries={}>".format(self.path, len(self._queries))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc, val, traceback):
+        self.close()
+
+    def record(self, connection, query, params, start, elapsed):
+        """Logs one statement run on ``connection`` (any hashable key)."""
+        if not isinstance(query, str):
+            query = str(query)
+        with self._lock:
+            if self._file is None:
+                return
+            qid = self._queries.get(query)
+            if qid is None:
+                qid = self._queries[query] = len(self._queries)
+                self._file.write(json.dumps({"id": qid, "sql": query}) + "\n")
+            cid = self._connections.get(connection)
+            if cid is None:
+                cid = self._connections[connection] = len(self._connections)
+            line = json.dumps([round(start - self.started, 6), round(elapsed, 6), cid, qid,
+                               _normalize_params(params) or None],
+                              default=_encode, separators=(",", ":"))
+            self._file.write(line + "\n")
+
+    def flush(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def load(path):
+    """Yields ``(offset, elapsed, connection, query, params)`` tuples from a
+    log written by `WorkloadRecorder`, in log order.
+    """
+    queries = {}
+    with open(path) as f:
+        for line in f:
+            item = json.loads(line, object_hook=_decode)
+            if isinstance(item, dict):
+                if "sql" in item:
+                    queries[item["id"]] = item["sql"]
+                continue
+            offset, elapsed, cid, qid, params = item
+            yield offset, elapsed, cid, queries[qid], params
+
+
+def percentile(values, pct):
+    """Returns the nearest-rank percentile of sorted ``values``."""
+    if not values:
+        return 0.0
+    index = max(0, min(len(values) - 1, int(math.ceil(pct / 100.0 * len(values))) - 1))
+    return values[index]
+
+
+def max_concurrency(events):
+    """Returns the largest number of statements that overlapped in time."""
+    edges = []
+    for offset, elapsed, _, _, _ in events:
+        edges.append((offset, 1))
+        edges.append((offset + elapsed, -1))
+    current = peak = 0
+    for _, delta in sorted(edges):
+        current += delta
+        peak = max(peak, current)
+    return peak
+
+
+def execute(conn, query, params):
+    """Runs one logged statement on a `mysqldb.Connection`,
+    `backend.Connection` or `sqa.Connection`, fetching any rows.
+    Statements captured from `sqa` are run with `to_pyformat` binds.
+    """
+    params = _normalize_params(params)
+    if isinstance(params, dict):
+        query, args, kwargs = to_pyformat(query, params), (), params
+    else:
+        args, kwargs = tuple(params), {}
+    if query.lstrip()[:6].lower() == "select":
+        return list(conn.query(query, *args, **kwargs))
+    return conn.execute(query, *args, **kwargs)
+
+
+def _stats(latencies):
+    latencies = sorted(latencies)
+    return {
+        "p50": percentile(latencies, 50),
+        "p90": percentile(latencies, 90),
+        "p99": percentile(latencies, 99),
+        "max": latencies[-1] if latencies else 0.0,
+    }
+
+
+def replay(path, connect, concurrency=8, speed=1.0):
+    """Replays a captured log on ``concurrency`` connections from
+    ``connect()``.
+
+    Statements of one captured connection always run in order on the same
+    replay connection. With ``speed`` 1.0 statements start at their
+    original offsets, 2.0 runs twice as fast, and None runs as fast as
+    possible. Returns a dict with throughput and latency percentiles of
+    the replay next to those of the capture.
+    """
+    events = list(load(path))
+    lanes = [[] for _ in range(concurrency)]
+    for event in events:
+        lanes[event[2] % concurrency].append(event)
+
+    origin = min([e[0] for e in events] or [0.0])
+    conns = [connect() for _ in lanes]
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def worker(conn, lane):
+        local, failed = [], 0
+        try:
+            for offset, _, _, query, params in lane:
+                if speed:
+                    delay = begin + (offset - origin) / speed - time.time()
+                    if delay > 0:
+                        time.sleep(delay)
+                start = time.time()
+                try:
+                    execute(conn, query, params)
+                except Exception:
+                    failed += 1
+                local.append(time.time() - start)
+        finally:
+            conn.close()
+            with lock:
+                latencies.extend(local)
+                errors[0] += failed
+
+    threads = [threading.Thread(target=worker, args=(conn, lane)) for conn, lane in zip(conns, lanes)]
+    begin = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = time.time() - begin
+
+    captured = [e[1] for e in events]
+    captured_duration = max([e[0] + e[1] for e in events] or [origin]) - origin
+    return {
+        "statements": len(events),
+        "errors": errors[0],
+        "concurrency": concurrency,
+        "speed": speed,
+        "duration": duration,
+        "throughput": len(events) / duration if duration else 0.0,
+        "latency": _stats(latencies),
+        "captured": {
+            "duration": captured_duration,
+            "throughput": len(events) / captured_duration if captured_duration else 0.0,
+            "max_concurrency": max_concurrency(events),
+            "latency": _stats(captured),
+        },
+    }
+
+
+def main():
+    from .backend import Connection
+
+    parser = argparse.ArgumentParser(description="Replay a captured torndb workload.")
+    parser.add_argument("command", choices=["replay"])
+    parser.add_argument("log")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--database", required=True)
+    parser.add_argument("--user")
+    parser.add_argument("--password")
+    parser.add_argument("--driver", default="auto")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="time scale for statement offsets; 0 replays at maximum speed")
+    args = parser.parse_args()
+
+    def connect():
+        return Connection(args.host, args.database, user=args.user,
+                          password=args.password, driver=args.driver)
+
+    report = replay(args.log, connect, concurrency=args.concurrency, speed=args.speed or None)
+    print(json.dumps(report, indent=2, sort_keys=True))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from operator import itemgetter
+
+from .upsert import quote_identifier
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class WriteBehindStats(object):
+    """Counters for a `WriteBehindBuffer`. Latencies are in seconds."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.accepted = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self.flushes = 0
+        self.errors = 0
+        self.last_flush_latency = 0.0
+        self.max_flush_latency = 0.0
+        self.total_flush_latency = 0.0
+
+    def _record_flush(self, nrows, latency, ok):
+        with self._lock:
+            self.flushes += 1
+            self.last_flush_latency = latency
+            self.max_flush_latency = max(self.max_flush_latency, latency)
+            self.total_flush_latency += latency
+            if ok:
+                self.written += nrows
+            else:
+                self.failed += nrows
+                self.errors += 1
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                "accepted": self.accepted,
+                "dropped": self.dropped,
+                "written": self.written,
+                "failed": self.failed,
+                "flushes": self.flushes,
+                "errors": self.errors,
+                "last_flush_latency": self.last_flush_latency,
+                "max_flush_latency": self.max_flush_latency,
+                "avg_flush_latency": self.total_flush_latency / self.flushes if self.flushes else 0.0,
+            }
+
+    def __repr__(self):
+        return "<WriteBehindStats {}>".format(self.as_dict())
+
+
+class WriteBehindBuffer(object):
+    """Buffers dict rows for ``table`` and writes them from a background
+    thread as multi-row INSERTs.
+
+    A batch is flushed once ``batch_size`` rows are pending or
+    ``flush_interval`` seconds have passed since its first row. At most
+    ``max_pending`` rows are held; `put` then drops the row and counts it
+    in ``stats.dropped``, unless asked to wait for room. Remaining rows are
+    flushed by `close`, which is also run at interpreter exit, waiting at
+    most ``exit_timeout`` seconds there.
+
+    ``db`` is a `mysqldb.Connection`, `PyMySQLConn` or `backend.Connection`
+    used only by the flushing thread, so it must not be shared.
+    """
+
+    def __init__(self, db, table, columns, batch_size=500, flush_interval=1.0,
+                 max_pending=10000, exit_timeout=10.0):
+        self.db = db
+        self.table = table
+        self.columns = list(columns)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.stats = WriteBehindStats()
+
+        placeholder = "(" + ", ".join(["%s"] * len(self.columns)) + ")"
+        self._sql = "INSERT INTO {} ({}) VALUES {}".format(
+            quote_identifier(table), ", ".join(quote_identifier(c) for c in self.columns),
+            placeholder)
+        getter = itemgetter(*self.columns)
+        if len(self.columns) == 1:
+            self._getter = lambda row: (getter(row),)
+        else:
+            self._getter = getter
+        self._queue = queue.Queue(max_pending)
+        self._closed = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="WriteBehindBuffer(%s)" % table)
+        self._thread.daemon = True
+        self._thread.start()
+        atexit.register(self.close, exit_timeout)
+
+    def __repr__(self):
+        return "<WriteBehindBuffer table={} pending={}>".format(self.table, self._queue.qsize())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc, val, traceback):
+        self.close()
+
+    def put(self, row, block=False, timeout=None):
+        """Queues a dict row for insertion. Returns False if the buffer was
+        full and the row was dropped.
+
+        By default this never waits, so a stalled database cannot hold up
+        the caller. With ``block=True`` it waits up to ``timeout`` seconds
+        (forever if None) for room first.
+        """
+        if self._closed:
+            raise RuntimeError("WriteBehindBuffer is closed")
+        if len(row) != len(self.columns):
+            raise ValueError("Row columns do not match {!r}: {!r}".format(self.columns, sorted(row)))
+        values = self._getter(row)
+        try:
+            self._queue.put(values, block=block, timeout=timeout)
+        except queue.Full:
+            with self.stats._lock:
+                self.stats.dropped += 1
+            return False
+        with self.stats._lock:
+            self.stats.accepted += 1
+        return True
+
+    def close(self, timeout=None):
+        """Stops accepting rows, flushes everything pending and stops the
+        background thread, waiting up to ``timeout`` seconds (forever if
+        None) for it. Rows still pending after that are written once the
+        database catches up, unless the interpreter exits first.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        atexit.unregister(self.close)
+        self._stop.set()
+        try:
+            # Only wakes an idle thread; a full queue means it is busy and
+            # sees the event after its current flush.
+            self._queue.put_nowait(_STOP)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = time.time() + self.flush_interval
+            while len(batch) < self.batch_size and not self._stop.is_set():
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    break
+                batch.append(item)
+            self._flush(batch)
+
+        # Rows still queued when stopping, including any racing with close().
+        batch = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                batch.append(item)
+            if len(batch) >= self.batch_size:
+                self._flush(batch)
+                batch = []
+        if batch:
+            self._flush(batch)
+
+    def _flush(self, batch):
+        start = time.time()
+        try:
+            self.db.executemany_rowcount(self._sql, batch)
+        except Exception:
+            logger.error("Failed writing %d rows to %s", len(batch), self.table, exc_info=True)
+            self.stats._record_flush(len(batch), time.time() - start, False)
+        else:
+            self.stats._record_flush(len(batch), time.time() - start, True)